@@ -0,0 +1,359 @@
+"""Offline benchmark for the booking API.
+
+Boots server.py against SQLite (or any DATABASE_URL, e.g. a local Postgres),
+swaps Google OAuth for a fake identity provider, seeds bookings and drives
+the API over HTTP from concurrent clients.
+
+    python bench/benchmark.py --rows 100000 --concurrency 16
+    python bench/benchmark.py --rows 1000000 --output bench/results/head.json
+    python bench/benchmark.py --compare bench/results/base.json bench/results/head.json
+
+Each scenario reports throughput, p50/p95/p99 latency, status codes and SQL
+statements per request. Results are written as JSON together with the git
+commit so runs can be compared across commits.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SLOTS_PER_DAY = 23
+SEED_START = date(2020, 1, 1)
+SERVICES = ['room', 'meeting', 'spa']
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.ok = True
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+class FakeGoogle:
+    """Stands in for flask_dance's `google` proxy.
+
+    The signed-in user is taken from the X-Bench-User header, so every
+    benchmark client can act as a different account.
+    """
+
+    def __init__(self, flask_request):
+        self.request = flask_request
+        self.userinfo_calls = 0
+
+    @property
+    def authorized(self):
+        return bool(self.request.headers.get('X-Bench-User'))
+
+    @property
+    def token(self):
+        return {'access_token': f"bench-{self.request.headers.get('X-Bench-User')}"}
+
+    def get(self, url):
+        self.userinfo_calls += 1
+        email = self.request.headers.get('X-Bench-User')
+        return FakeResponse({'email': email, 'name': email.split('@')[0], 'picture': None})
+
+
+def user_email(index):
+    return f"user{index}@bench.local"
+
+
+def load_app(database_url, show_server_output=False):
+    os.environ['DATABASE_URL'] = database_url
+    # The app logs each request to stderr; keep runs readable and the logging cost out of the timings.
+    os.environ.setdefault('LOG_LEVEL', 'INFO' if show_server_output else 'WARNING')
+    os.chdir(REPO_ROOT)
+    sys.path.insert(0, str(REPO_ROOT))
+    with contextlib.redirect_stdout(io.StringIO()):
+        import server
+        server.app = server.create_app()
+        with server.app.app_context():
+            server.upgrade_database()
+    from flask import request
+    from sqlalchemy import event
+
+    server.google = FakeGoogle(request)
+    sql_counts = threading.local()
+
+    with server.app.app_context():
+        engines = list(server.db.engines.values())
+
+    def count_statement(*args, **kwargs):
+        sql_counts.value = getattr(sql_counts, 'value', 0) + 1
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count_statement)
+
+    @server.app.before_request
+    def reset_sql_count():
+        sql_counts.value = 0
+
+    @server.app.after_request
+    def report_sql_count(response):
+        response.headers['X-Bench-SQL'] = str(getattr(sql_counts, 'value', 0))
+        return response
+
+    return server
+
+
+def seed(server, rows, users, batch_size=10000):
+    """Insert `rows` bookings spread over `users` accounts.
+
+    A few front-desk accounts own most rows, like production. One in ten
+    bookings is cancelled; the rest take distinct (date, time) slots.
+    """
+    from sqlalchemy import insert
+    rng = random.Random(42)
+    weights = [50 if i < max(1, users // 50) else 1 for i in range(users)]
+    owners = rng.choices(range(users), weights=weights, k=rows)
+    started = time.perf_counter()
+    with server.app.app_context():
+        batch = []
+        for i in range(rows):
+            day = SEED_START + timedelta(days=i // SLOTS_PER_DAY)
+            slot = i % SLOTS_PER_DAY
+            email = user_email(owners[i])
+            batch.append({
+                'id': f"BKSEED{i:010d}",
+                'service': SERVICES[i % len(SERVICES)],
+                'date': day,
+                'time': datetime.strptime(server.schedule_slots(None)[slot], '%H:%M').time(),
+                'name': 'Bench Guest',
+                'email': email,
+                'phone': '5550100',
+                'notes': '',
+                'status': 'cancelled' if i % 10 == 9 else 'confirmed',
+                'user_email': email
+            })
+            if len(batch) >= batch_size:
+                server.db.session.execute(insert(server.Booking), batch)
+                server.db.session.commit()
+                batch = []
+        if batch:
+            server.db.session.execute(insert(server.Booking), batch)
+            server.db.session.commit()
+    last_day = SEED_START + timedelta(days=rows // SLOTS_PER_DAY)
+    return time.perf_counter() - started, last_day
+
+
+def start_server(server):
+    from werkzeug.serving import make_server, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    httpd = make_server('127.0.0.1', 0, server.app, threaded=True, request_handler=QuietHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd, f"http://127.0.0.1:{httpd.server_port}"
+
+
+class Client:
+    def __init__(self, base_url, email):
+        import requests
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers['X-Bench-User'] = email
+
+    def call(self, method, path, **kwargs):
+        started = time.perf_counter()
+        response = self.session.request(method, self.base_url + path, **kwargs)
+        elapsed = time.perf_counter() - started
+        return response, elapsed
+
+
+def make_scenarios(users, last_day, slots_per_day, rng_lock):
+    rng = random.Random(7)
+    future_slots = iter(range(10 ** 9))
+    future_start = last_day + timedelta(days=30)
+
+    def pick_user():
+        with rng_lock:
+            return rng.randrange(min(users, max(1, users // 50)) if rng.random() < 0.5 else users)
+
+    def pick_date():
+        with rng_lock:
+            return SEED_START + timedelta(days=rng.randrange(max(1, (last_day - SEED_START).days)))
+
+    def new_booking():
+        with rng_lock:
+            n = next(future_slots)
+        day = future_start + timedelta(days=n // len(slots_per_day))
+        return {'service': 'spa', 'date': day.isoformat(), 'time': slots_per_day[n % len(slots_per_day)],
+                'name': 'Bench Guest', 'email': 'guest@bench.local', 'phone': '5550100'}
+
+    def list_bookings(client):
+        return [('GET /api/bookings', *client.call('GET', '/api/bookings'))]
+
+    def htmx_list(client):
+        return [('GET /htmx/bookings-list', *client.call('GET', '/htmx/bookings-list', headers={'HX-Request': 'true'}))]
+
+    def slots(client):
+        return [('GET /api/slots/<date>', *client.call('GET', f'/api/slots/{pick_date().isoformat()}'))]
+
+    def write_cycle(client):
+        results = []
+        response, elapsed = client.call('POST', '/api/bookings', json=new_booking())
+        results.append(('POST /api/bookings', response, elapsed))
+        if response.status_code != 201:
+            return results
+        booking_id = response.json()['id']
+        results.append(('PUT /api/bookings/<id>', *client.call('PUT', f'/api/bookings/{booking_id}', json={'notes': 'bench'})))
+        results.append(('DELETE /api/bookings/<id>', *client.call('DELETE', f'/api/bookings/{booking_id}')))
+        return results
+
+    return pick_user, {
+        'list': list_bookings,
+        'htmx-list': htmx_list,
+        'slots': slots,
+        'write': write_cycle
+    }
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples, wall_seconds):
+    summary = {}
+    for name in sorted({s[0] for s in samples}):
+        rows = [s for s in samples if s[0] == name]
+        latencies = [s[2] for s in rows]
+        sql = [s[3] for s in rows if s[3] is not None]
+        statuses = {}
+        for s in rows:
+            statuses[str(s[1])] = statuses.get(str(s[1]), 0) + 1
+        summary[name] = {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / wall_seconds, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(statistics.mean(latencies) * 1000, 2),
+            'sql_per_request': round(statistics.mean(sql), 2) if sql else None,
+            'status_codes': statuses
+        }
+    return summary
+
+
+def run_scenario(base_url, scenario, pick_user, requests_per_client, concurrency):
+    def worker(worker_id):
+        client = Client(base_url, user_email(pick_user()))
+        samples = []
+        for _ in range(requests_per_client):
+            for name, response, elapsed in scenario(client):
+                sql = response.headers.get('X-Bench-SQL')
+                samples.append((name, response.status_code, elapsed, int(sql) if sql else None))
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = [s for batch in pool.map(worker, range(concurrency)) for s in batch]
+    return summarize(samples, time.perf_counter() - started)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path, head_path):
+    base = json.loads(Path(base_path).read_text())
+    head = json.loads(Path(head_path).read_text())
+    print(f"{'endpoint':32} {'metric':16} {base.get('commit') or 'base':>12} {head.get('commit') or 'head':>12} {'change':>9}")
+    for scenario, endpoints in head['scenarios'].items():
+        for endpoint, metrics in endpoints.items():
+            before = base['scenarios'].get(scenario, {}).get(endpoint)
+            if not before:
+                continue
+            for metric in ('throughput_rps', 'p50_ms', 'p99_ms', 'sql_per_request'):
+                old, new = before.get(metric), metrics.get(metric)
+                if old is None or new is None:
+                    continue
+                change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+                print(f"{endpoint:32} {metric:16} {old:>12} {new:>12} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='SQLAlchemy URL; defaults to a fresh SQLite file')
+    parser.add_argument('--rows', type=int, default=10000, help='bookings to seed (10k-1M)')
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='iterations per client per scenario')
+    parser.add_argument('--scenarios', default='list,htmx-list,slots,write')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--show-server-output', action='store_true', help='keep server prints and INFO request logs')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='booking-bench-')
+    database_url = args.database_url or f"sqlite:///{workdir}/bench.db"
+    server = load_app(database_url, args.show_server_output)
+
+    print(f"Seeding {args.rows} bookings for {args.users} users...")
+    seed_seconds, last_day = seed(server, args.rows, args.users)
+    print(f"Seeded in {seed_seconds:.1f}s")
+
+    httpd, base_url = start_server(server)
+    pick_user, scenarios = make_scenarios(args.users, last_day, server.schedule_slots(None), threading.Lock())
+    results = {}
+    try:
+        for name in args.scenarios.split(','):
+            print(f"Running {name} (concurrency {args.concurrency})...")
+            quiet = contextlib.nullcontext() if args.show_server_output else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                results[name] = run_scenario(base_url, scenarios[name], pick_user, args.requests, args.concurrency)
+            for endpoint, metrics in results[name].items():
+                print(f"  {endpoint:28} {metrics['throughput_rps']:>8} req/s  "
+                      f"p50 {metrics['p50_ms']:>7}ms  p95 {metrics['p95_ms']:>7}ms  p99 {metrics['p99_ms']:>7}ms  "
+                      f"sql/req {metrics['sql_per_request']}  {metrics['status_codes']}")
+    finally:
+        httpd.shutdown()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'database': database_url.split(':', 1)[0],
+        'rows': args.rows,
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'requests_per_client': args.requests,
+        'seed_seconds': round(seed_seconds, 2),
+        'userinfo_calls': server.google.userinfo_calls,
+        'scenarios': results
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
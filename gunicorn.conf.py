@@ -0,0 +1,60 @@
+"""Gunicorn settings for serving the booking app in production.
+
+    flask --app server db upgrade      # once per deploy
+    gunicorn -c gunicorn.conf.py
+
+Worker classes (GUNICORN_WORKER_CLASS):
+
+- gthread (default): each worker process serves GUNICORN_THREADS requests at
+  once, so a thread waiting on Google or the database leaves the others free.
+  Every open /api/events stream holds a thread for as long as the tab stays
+  open, so raise GUNICORN_THREADS if many users keep the app open.
+- gevent: each worker serves up to GUNICORN_WORKER_CONNECTIONS requests as
+  greenlets, and outbound HTTP yields while waiting. Best for many idle SSE
+  streams and logged-in users. Needs `pip install gevent psycogreen`. Without
+  psycogreen, PostgreSQL calls still block the whole worker.
+
+Tuning knobs (environment variables):
+
+- WEB_CONCURRENCY: worker processes. Default is the CPU count.
+- GUNICORN_THREADS / GUNICORN_WORKER_CONNECTIONS: concurrency per worker.
+- SQL_POOL_SIZE + SQL_MAX_OVERFLOW: database connections per worker. Keep
+  them near the number of requests a worker runs at once; extra requests
+  wait up to SQL_POOL_TIMEOUT. Check db_pool utilization in /api/status.
+  Across all workers, stay under the database's max_connections.
+- HTTP_POOL_MAXSIZE: idle keep-alive connections to each Google host per
+  worker. HTTP_TIMEOUT_SECONDS bounds every outbound call.
+- AVATAR_FETCH_WORKERS: background avatar downloads per worker.
+- GUNICORN_TIMEOUT / GUNICORN_KEEPALIVE / GUNICORN_MAX_REQUESTS: standard
+  gunicorn settings.
+"""
+import multiprocessing
+import os
+
+wsgi_app = 'server:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+# The app writes its own structured request logs (see LOG_LEVELS).
+accesslog = None
+errorlog = '-'
+
+def post_fork(server, worker):
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning('psycogreen is not installed; database calls will block gevent workers')
+    else:
+        patch_psycopg()
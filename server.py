@@ -1,21 +1,205 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Blueprint, render_template, request, jsonify, send_file, make_response, Response, current_app
 from datetime import datetime, timedelta
 import json
+import logging
+import logging.handlers
+import contextvars
+import random
+import atexit
+from itertools import islice
+import base64
+import gzip
+import mimetypes
+import csv
+import hmac
+import io
+import sys
+import zlib
 import uuid
+import click
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from dotenv import load_dotenv
 import os
 from flask_dance.contrib.google import make_google_blueprint, google
-from flask import session, redirect, url_for
-from functools import wraps
+from flask import session, redirect, url_for, g, has_app_context, has_request_context, stream_with_context
+from flask.cli import AppGroup
+from flask import send_from_directory, abort
+from werkzeug.local import LocalProxy
+from werkzeug.security import safe_join
+from markupsafe import Markup
+from functools import wraps, lru_cache
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from flask_dance.consumer import oauth_authorized
+from flask_dance.consumer.requests import OAuth2Session
 import hashlib
 from pathlib import Path
-from sqlalchemy import text
+from sqlalchemy import text, tuple_, insert, update, Insert, Update, Delete, event
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+import threading
+import time
+import queue
+import select
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 load_dotenv()
 
-app = Flask(__name__)
+bp = Blueprint('booking', __name__, cli_group=None)
+
+def new_app_state():
+    """Caches and bookkeeping owned by one app; create_app() gives each app its own."""
+    return {
+        'schema': {'version': 0, 'capabilities': frozenset(), 'loaded': False},
+        'availability_cache': OrderedDict(),
+        'availability': {'generation': 0},
+        'resource_versions': OrderedDict(),
+        'fragment_cache': OrderedDict(),
+        'fragment_owners': {},
+        'fragment': {'shared': None},
+        'idempotency_inflight': {},
+        'event_streams': set(),
+        'asset_manifest': {}
+    }
+
+def app_state(name):
+    # Module-level names below resolve to the current app's copy, like flask.g.
+    return LocalProxy(lambda: current_app.extensions['booking_state'][name])
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+request_id_var = contextvars.ContextVar('request_id', default=None)
+log_stats = {'dropped': 0, 'sampled_out': 0}
+log_state = {'listener': None}
+
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+def parse_log_settings(value, convert):
+    """Parse 'booking.db=DEBUG,booking.avatar=0.1' style settings."""
+    settings = {}
+    for item in value.split(','):
+        name, _, setting = item.partition('=')
+        if name.strip() and setting.strip():
+            settings[name.strip()] = convert(setting.strip())
+    return settings
+
+class RequestContextFilter(logging.Filter):
+    """Stamps records with the current request ID and samples DEBUG records.
+
+    Sampling rates apply to the named logger and its children; INFO and
+    above are never sampled out.
+    """
+
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def sample_rate(self, name):
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and random.random() >= self.sample_rate(record.name):
+            log_stats['sampled_out'] += 1
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are dropped when the queue is full."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_stats['dropped'] += 1
+
+    def prepare(self, record):
+        # Format the message on the caller's thread but keep structured fields.
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = logging.Formatter().formatException(record.exc_info) if record.exc_info else None
+        record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in RECORD_ATTRIBUTES})
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        fields = ' '.join(f'{k}={v}' for k, v in vars(record).items() if k not in RECORD_ATTRIBUTES)
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} [{getattr(record, 'request_id', None) or '-'}] {record.getMessage()}"
+        line = f'{line} {fields}' if fields else line
+        return f'{line}\n{record.exc_text}' if record.exc_text else line
+
+def configure_logging():
+    """Route the 'booking' loggers through a queue drained by a background thread.
+
+    Safe to call more than once; only the first call starts the listener.
+    """
+    if log_state['listener'] is not None:
+        return log_state['listener']
+    root = logging.getLogger('booking')
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for name, level in parse_log_settings(LOG_LEVELS, str.upper).items():
+        logging.getLogger(name).setLevel(level)
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TextFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(parse_log_settings(LOG_SAMPLE_RATES, float)))
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    log_state['listener'] = listener
+    return listener
+
+log = logging.getLogger('booking')
+auth_log = logging.getLogger('booking.auth')
+avatar_log = logging.getLogger('booking.avatar')
+db_log = logging.getLogger('booking.db')
+events_log = logging.getLogger('booking.events')
+bookings_log = logging.getLogger('booking.bookings')
+http_log = logging.getLogger('booking.http')
+
+def user_ref(user_email):
+    """Stable, non-reversible reference to a user for log correlation."""
+    return hashlib.sha256(user_email.encode()).hexdigest()[:12] if user_email else None
 
 SQL_TYPE = os.getenv('SQL_TYPE')
 SQL_USER = os.getenv('SQL_USER')
@@ -24,87 +208,363 @@ SQL_HOST = os.getenv('SQL_HOST')
 SQL_PORT = os.getenv('SQL_PORT')
 SQL_DB = os.getenv('SQL_DB')
 
-db_uri = f"{SQL_TYPE}://{SQL_USER}:{SQL_PASSWORD}@{SQL_HOST}:{SQL_PORT}/{SQL_DB}"
-app.config['SQLALCHEMY_DATABASE_URI'] = db_uri
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+SQL_REPLICA_HOST = os.getenv('SQL_REPLICA_HOST')
+SQL_REPLICA_PORT = os.getenv('SQL_REPLICA_PORT', SQL_PORT)
+SQL_POOL_SIZE = int(os.getenv('SQL_POOL_SIZE', '5'))
+SQL_MAX_OVERFLOW = int(os.getenv('SQL_MAX_OVERFLOW', '10'))
+SQL_POOL_TIMEOUT = int(os.getenv('SQL_POOL_TIMEOUT', '30'))
+SQL_POOL_RECYCLE = int(os.getenv('SQL_POOL_RECYCLE', '1800'))
+SQL_POOL_PRE_PING = os.getenv('SQL_POOL_PRE_PING', 'true').lower() == 'true'
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {'checkouts': 0, 'wait_seconds': 0.0, 'max_wait_seconds': 0.0, 'timeouts': 0}
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            self.wait_stats['timeouts'] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_stats['checkouts'] += 1
+            self.wait_stats['wait_seconds'] += waited
+            self.wait_stats['max_wait_seconds'] = max(self.wait_stats['max_wait_seconds'], waited)
+
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        return {}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': SQL_POOL_SIZE,
+        'max_overflow': SQL_MAX_OVERFLOW,
+        'pool_timeout': SQL_POOL_TIMEOUT,
+        'pool_recycle': SQL_POOL_RECYCLE,
+        'pool_pre_ping': SQL_POOL_PRE_PING
+    }
+
+class RoutingSession(FlaskSession):
+    """Sends reads from read-only requests to the replica, everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        is_write = self._flushing or isinstance(clause, (Insert, Update, Delete))
+        if has_app_context():
+            if is_write:
+                g.db_write = True
+            elif bind is None and g.get('read_only') and 'replica' in self._db.engines:
+                return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
 GOOGLE_OAUTH_CLIENT_ID = os.getenv('GOOGLE_OAUTH_CLIENT_ID')
 GOOGLE_OAUTH_CLIENT_SECRET = os.getenv('GOOGLE_OAUTH_CLIENT_SECRET')
 
-AVATARS_DIR = Path("static/avatars")
-AVATARS_DIR.mkdir(exist_ok=True)
+IDENTITY_TTL_SECONDS = int(os.getenv('IDENTITY_TTL_SECONDS', '300'))
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '0.5'))
+
+AVAILABILITY_CACHE_SIZE = int(os.getenv('AVAILABILITY_CACHE_SIZE', '1024'))
+AVAILABILITY_CACHE_TTL = int(os.getenv('AVAILABILITY_CACHE_TTL', '30'))
+MAX_SLOT_RANGE_DAYS = 62
+VERSION_TTL_SECONDS = int(os.getenv('VERSION_TTL_SECONDS', str(AVAILABILITY_CACHE_TTL)))
+VERSION_CACHE_SIZE = int(os.getenv('VERSION_CACHE_SIZE', '10000'))
+SERVICES_MAX_AGE = int(os.getenv('SERVICES_MAX_AGE', '86400'))
+EVENT_BACKEND = os.getenv('EVENT_BACKEND', 'local')
+EVENT_STREAM_QUEUE_SIZE = 100
+EVENT_STREAM_HEARTBEAT_SECONDS = 15
+BOOKINGS_PAGE_SIZE = 50
+MAX_BOOKINGS_PAGE_SIZE = 200
+MAX_BATCH_BOOKINGS = 100
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', '5000'))
+FRAGMENT_CACHE_URL = os.getenv('FRAGMENT_CACHE_URL')
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', '86400'))
+
+DEFAULT_SCHEDULE = {'open': '08:00', 'close': '19:30', 'slot_minutes': 30}
+SERVICE_SCHEDULES = {
+    'room': DEFAULT_SCHEDULE,
+    'meeting': DEFAULT_SCHEDULE,
+    'spa': DEFAULT_SCHEDULE
+}
+
+SERVICES = [
+    {
+        'id': 'room',
+        'name': 'Hotel Room',
+        'description': 'Comfortable accommodation',
+        'price': '$150/night',
+        'icon': 'fas fa-bed'
+    },
+    {
+        'id': 'meeting',
+        'name': 'Meeting Room',
+        'description': 'Professional meeting space',
+        'price': '$75/hour',
+        'icon': 'fas fa-users'
+    },
+    {
+        'id': 'spa',
+        'name': 'Spa Treatment',
+        'description': 'Relaxing wellness services',
+        'price': '$120/session',
+        'icon': 'fas fa-spa'
+    }
+]
+SERVICES_ETAG = hashlib.sha1(json.dumps(SERVICES, sort_keys=True).encode()).hexdigest()[:20]
+
+STATIC_DIR = Path(__file__).with_name('static')
+AVATARS_DIR = STATIC_DIR / 'avatars'
+ASSETS_DIR = STATIC_DIR / 'dist'
+ASSET_FILES = ('app.js', 'styles.css')
+ASSET_MAX_AGE = 365 * 24 * 3600
+AVATAR_CACHE_MAX_BYTES = int(os.getenv('AVATAR_CACHE_MAX_BYTES', str(20 * 1024 * 1024)))
+AVATAR_REVALIDATE_SECONDS = int(os.getenv('AVATAR_REVALIDATE_SECONDS', '86400'))
+AVATAR_FETCH_WORKERS = int(os.getenv('AVATAR_FETCH_WORKERS', '2'))
+
+HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '32'))
+HTTP_TIMEOUT_SECONDS = float(os.getenv('HTTP_TIMEOUT_SECONDS', '10'))
+
+# One keep-alive connection pool per process for every outbound call to Google.
+# HTTP_POOL_CONNECTIONS is the number of hosts kept, HTTP_POOL_MAXSIZE the
+# idle connections kept per host (size it to threads/greenlets per worker).
+http_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+http_session = requests.Session()
+http_session.mount('https://', http_adapter)
+http_session.mount('http://', http_adapter)
+
+class PooledOAuth2Session(OAuth2Session):
+    """Flask-Dance builds a session per request; share the process-wide pool and add a timeout."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mount('https://', http_adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT_SECONDS)
+        return super().request(method, url, *args, **kwargs)
 
 google_bp = make_google_blueprint(
     client_id=GOOGLE_OAUTH_CLIENT_ID,
     client_secret=GOOGLE_OAUTH_CLIENT_SECRET,
+    session_class=PooledOAuth2Session,
     scope=[
         "https://www.googleapis.com/auth/userinfo.profile",
         "https://www.googleapis.com/auth/userinfo.email",
         "openid"
     ]
 )
-app.register_blueprint(google_bp, url_prefix="/login")
 
-def cache_google_avatar(google_avatar_url, user_email):
-    if not google_avatar_url:
-        return None
-    
+avatar_executor = ThreadPoolExecutor(max_workers=AVATAR_FETCH_WORKERS, thread_name_prefix='avatar')
+avatar_index = OrderedDict()
+avatar_inflight = {}
+avatar_lock = threading.Lock()
+avatar_state = {'bytes': 0}
+avatar_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'downloads': 0, 'not_modified': 0, 'errors': 0}
+
+def avatar_filename(user_email):
+    return f"{hashlib.sha256(user_email.encode()).hexdigest()[:32]}.jpg"
+
+def avatar_version(stat):
+    # Changes whenever a download replaces the file, so it can go in an immutable URL.
+    return f'{stat.st_mtime_ns:x}{stat.st_size:x}'
+
+def load_avatar_index():
+    """Index avatars already on disk, least recently modified first.
+
+    Validators are not persisted, so entries loaded here adopt the first URL
+    they are looked up with and revalidate once their mtime is stale.
+    """
+    files = sorted(AVATARS_DIR.glob('*.jpg'), key=lambda p: p.stat().st_mtime)
+    with avatar_lock:
+        for filepath in files:
+            stat = filepath.stat()
+            avatar_index[filepath.name] = {
+                'url': None,
+                'etag': None,
+                'last_modified': None,
+                'size': stat.st_size,
+                'checked_at': stat.st_mtime,
+                'version': avatar_version(stat)
+            }
+            avatar_state['bytes'] += stat.st_size
+
+def evict_avatars(keep):
+    # Caller holds avatar_lock.
+    while avatar_state['bytes'] > AVATAR_CACHE_MAX_BYTES and len(avatar_index) > 1:
+        filename, entry = avatar_index.popitem(last=False)
+        if filename == keep:
+            avatar_index[filename] = entry
+            continue
+        avatar_state['bytes'] -= entry['size']
+        avatar_stats['evictions'] += 1
+        try:
+            (AVATARS_DIR / filename).unlink()
+        except FileNotFoundError:
+            pass
+
+def fetch_avatar(google_avatar_url, user_email, filename, validators):
+    headers = {}
+    if validators and validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators and validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    started = time.perf_counter()
     try:
-        url_hash = hashlib.md5(google_avatar_url.encode()).hexdigest()
-        filename = f"{url_hash}_{user_email}.jpg"
-        filepath = AVATARS_DIR / filename
-        
-        if filepath.exists():
-            print(f"Avatar already cached for {user_email}: {filename}")
-            return f"/static/avatars/{filename}"
-        
-        print(f"Caching avatar for {user_email} from {google_avatar_url}")
-        
-        response = requests.get(google_avatar_url, timeout=10)
-        if response.status_code == 200:
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
-            print(f"Successfully cached avatar for {user_email}: {filename}")
-            return f"/static/avatars/{filename}"
-        else:
-            print(f"Failed to download avatar: HTTP {response.status_code}")
-            return None
-            
-    except requests.exceptions.Timeout:
-        print(f"Timeout while downloading avatar for {user_email}")
-        return None
+        response = http_session.get(google_avatar_url, headers=headers, timeout=HTTP_TIMEOUT_SECONDS)
     except requests.exceptions.RequestException as e:
-        print(f"Request error while downloading avatar for {user_email}: {str(e)}")
-        return None
-    except Exception as e:
-        print(f"Error caching avatar for {user_email}: {str(e)}")
+        avatar_log.warning('avatar download failed', extra={'user': user_ref(user_email), 'error': str(e)})
+        with avatar_lock:
+            avatar_stats['errors'] += 1
+        return
+    finally:
+        observe_google_call('avatar', time.perf_counter() - started)
+
+    if response.status_code == 304:
+        with avatar_lock:
+            entry = avatar_index.get(filename)
+            if entry:
+                entry['checked_at'] = time.time()
+            avatar_stats['not_modified'] += 1
+        return
+
+    if response.status_code != 200:
+        avatar_log.warning('avatar download failed', extra={'user': user_ref(user_email), 'status': response.status_code})
+        with avatar_lock:
+            avatar_stats['errors'] += 1
+        return
+
+    filepath = AVATARS_DIR / filename
+    tmp_path = filepath.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp_path, filepath)
+    version = avatar_version(filepath.stat())
+    avatar_log.info('avatar cached', extra={'user': user_ref(user_email), 'file': filename, 'bytes': len(response.content)})
+
+    with avatar_lock:
+        previous = avatar_index.pop(filename, None)
+        if previous:
+            avatar_state['bytes'] -= previous['size']
+        avatar_index[filename] = {
+            'url': google_avatar_url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'size': len(response.content),
+            'checked_at': time.time(),
+            'version': version
+        }
+        avatar_state['bytes'] += len(response.content)
+        avatar_stats['downloads'] += 1
+        evict_avatars(keep=filename)
+
+def schedule_avatar_fetch(google_avatar_url, user_email, filename, validators):
+    # Caller holds avatar_lock; at most one fetch per user is in flight.
+    if filename in avatar_inflight:
+        return
+    def run():
+        try:
+            fetch_avatar(google_avatar_url, user_email, filename, validators)
+        finally:
+            # Blocks until the caller has released avatar_lock, so the entry is already set.
+            with avatar_lock:
+                avatar_inflight.pop(filename, None)
+
+    # Run in a copy of the caller's context so the fetch logs under its request ID.
+    avatar_inflight[filename] = avatar_executor.submit(contextvars.copy_context().run, run)
+
+def cache_google_avatar(google_avatar_url, user_email):
+    """Return the local avatar path for a user, or None if it isn't cached yet.
+
+    Never blocks on the network: missing, changed or stale avatars are
+    (re)fetched by the background pool and callers fall back to the Google
+    URL meanwhile.
+    """
+    if not google_avatar_url or not user_email:
         return None
 
+    filename = avatar_filename(user_email)
+    with avatar_lock:
+        entry = avatar_index.get(filename)
+        if entry is None:
+            avatar_stats['misses'] += 1
+            schedule_avatar_fetch(google_avatar_url, user_email, filename, None)
+            return None
+
+        avatar_stats['hits'] += 1
+        avatar_index.move_to_end(filename)
+        if entry['url'] is None:
+            entry['url'] = google_avatar_url
+        if entry['url'] != google_avatar_url:
+            schedule_avatar_fetch(google_avatar_url, user_email, filename, None)
+        elif time.time() - entry['checked_at'] > AVATAR_REVALIDATE_SECONDS:
+            schedule_avatar_fetch(google_avatar_url, user_email, filename, {
+                'etag': entry['etag'],
+                'last_modified': entry['last_modified']
+            })
+        version = entry['version']
+    return f"/avatars/{filename}?v={version}"
+
+def display_user(user):
+    """The identity as shown to the browser, with the cached avatar when ready."""
+    if not user:
+        return user
+    return dict(user, picture=cache_google_avatar(user['picture'], user['email']) or user['picture'])
+
+
+def parse_booking_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_booking_time(value):
+    return datetime.strptime(value[:5], '%H:%M').time()
+
+# Bookings in these states don't hold their slot. 'conflict' marks the
+# double bookings found by migration 4.
+INACTIVE_STATUSES = ('cancelled', 'conflict')
+
 class Booking(db.Model):
     id = db.Column(db.String, primary_key=True)
     service = db.Column(db.String, nullable=False)
-    date = db.Column(db.String, nullable=False)
-    time = db.Column(db.String, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    time = db.Column(db.Time, nullable=False)
     name = db.Column(db.String, nullable=False)
     email = db.Column(db.String, nullable=False)
     phone = db.Column(db.String, nullable=False)
     notes = db.Column(db.String, default='')
     status = db.Column(db.String, default='confirmed')
     user_email = db.Column(db.String, nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        db.Index('ix_booking_slot', 'date', 'time', 'status'),
+        db.Index('ix_booking_user_status', 'user_email', 'status'),
+        db.Index('ix_booking_user_slot', 'user_email', 'date', 'time', 'id'),
+        db.Index(
+            'uq_booking_slot', 'date', 'time',
+            unique=True,
+            postgresql_where=text("status NOT IN ('cancelled', 'conflict')"),
+            sqlite_where=text("status NOT IN ('cancelled', 'conflict')")
+        ).ddl_if(dialect=('postgresql', 'sqlite')),
+    )
 
     def to_dict(self):
         base_dict = {
             'id': self.id,
             'service': self.service,
-            'date': self.date,
-            'time': self.time,
+            'date': self.date.isoformat(),
+            'time': self.time.strftime('%H:%M'),
             'name': self.name,
             'email': self.email,
             'phone': self.phone,
             'notes': self.notes,
             'status': self.status,
+            'version': self.version,
         }
         
         try:
@@ -115,461 +575,2093 @@ class Booking(db.Model):
             
         return base_dict
 
+class SchemaVersion(db.Model):
+    __tablename__ = 'schema_version'
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+MIGRATIONS = []
+schema_state = app_state('schema')
+
+def migration(version, name, provides=(), dialects=None):
+    """Register an ordered schema migration.
+
+    `provides` lists the capabilities (e.g. 'booking.user_email') handlers may
+    rely on once the migration has been applied. Migrations limited to
+    `dialects` are recorded but not run elsewhere, and provide nothing there.
+    """
+    def register(fn):
+        MIGRATIONS.append({
+            'version': version,
+            'name': name,
+            'apply': fn,
+            'provides': frozenset(provides),
+            'dialects': dialects
+        })
+        MIGRATIONS.sort(key=lambda m: m['version'])
+        return fn
+    return register
+
+def has_capability(name):
+    return name in schema_state['capabilities']
+
 def column_exists(table_name, column_name):
     try:
         inspector = db.inspect(db.engine)
         columns = [col['name'] for col in inspector.get_columns(table_name)]
         return column_name in columns
     except Exception as e:
-        print(f"Error checking if column {column_name} exists: {e}")
+        db_log.error('column lookup failed', extra={'table': table_name, 'column': column_name, 'error': str(e)})
         return False
 
-def ensure_migration():
-    try:
-        if not column_exists('booking', 'user_email'):
-            print("user_email column missing, running migration...")
-            migrate_database()
-            if not column_exists('booking', 'user_email'):
-                print("Warning: Migration failed, some features may not work properly")
-        return True
-    except Exception as e:
-        print(f"Error during migration check: {e}")
-        return False
+def add_column(table_name, column_name, types):
+    """ALTER TABLE ... ADD COLUMN using the type declared for the current dialect."""
+    if column_exists(table_name, column_name):
+        db_log.debug('column already exists', extra={'table': table_name, 'column': column_name})
+        return
+    column_type = types.get(db.engine.dialect.name, types['default'])
+    db_log.info('adding column', extra={'table': table_name, 'column': column_name})
+    db.session.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
 
-def migrate_database():
-    try:
-        inspector = db.inspect(db.engine)
-        columns = [col['name'] for col in inspector.get_columns('booking')]
-        
-        if 'user_email' not in columns:
-            print("Adding user_email column to booking table...")
-            
-            if 'postgresql' in str(db.engine.url).lower():
-                db.session.execute(text('ALTER TABLE booking ADD COLUMN user_email VARCHAR'))
-            elif 'mysql' in str(db.engine.url).lower():
-                db.session.execute(text('ALTER TABLE booking ADD COLUMN user_email VARCHAR(255)'))
-            elif 'sqlite' in str(db.engine.url).lower():
-                db.session.execute(text('ALTER TABLE booking ADD COLUMN user_email TEXT'))
-            else:
-                db.session.execute(text('ALTER TABLE booking ADD COLUMN user_email VARCHAR(255)'))
-            
-            db.session.commit()
-            print("Successfully added user_email column")
-        else:
-            print("user_email column already exists")
-            
-    except Exception as e:
-        print(f"Database migration error: {e}")
-        db.session.rollback()
+@migration(1, 'add booking.user_email', provides={'booking.user_email'})
+def add_booking_user_email():
+    add_column('booking', 'user_email', {
+        'postgresql': 'VARCHAR',
+        'mysql': 'VARCHAR(255)',
+        'sqlite': 'TEXT',
+        'default': 'VARCHAR(255)'
+    })
+
+def migration_supported(m):
+    return m['dialects'] is None or db.engine.dialect.name in m['dialects']
+
+def column_has_type(table_name, column_name, type_class):
+    inspector = db.inspect(db.engine)
+    for col in inspector.get_columns(table_name):
+        if col['name'] == column_name:
+            return isinstance(col['type'], type_class)
+    return False
+
+def create_index(name):
+    index = next(i for i in Booking.__table__.indexes if i.name == name)
+    index.create(db.session.connection(), checkfirst=True)
+
+@migration(2, 'booking.date/time as DATE/TIME')
+def convert_booking_date_time():
+    quote = db.engine.dialect.identifier_preparer.quote_identifier
+    dialect = db.engine.dialect.name
+    for column_name, type_class, sql_type in (('date', db.Date, 'DATE'), ('time', db.Time, 'TIME')):
+        if column_has_type('booking', column_name, type_class):
+            continue
+        db_log.info('converting column', extra={'table': 'booking', 'column': column_name, 'type': sql_type})
+        column = quote(column_name)
+        if dialect == 'postgresql':
+            db.session.execute(text(
+                f'ALTER TABLE booking ALTER COLUMN {column} TYPE {sql_type} USING {column}::{sql_type.lower()}'
+            ))
+        elif dialect == 'mysql':
+            db.session.execute(text(f'ALTER TABLE booking MODIFY COLUMN {column} {sql_type} NOT NULL'))
+        elif dialect == 'sqlite' and column_name == 'time':
+            # SQLite keeps the declared type; normalise 'HH:MM' to the format SQLAlchemy's Time reads.
+            db.session.execute(text(
+                f"UPDATE booking SET {column} = {column} || :seconds WHERE length({column}) = 5"
+            ), {'seconds': ':00.000000'})
+
+@migration(3, 'booking slot and user indexes')
+def add_booking_indexes():
+    create_index('ix_booking_slot')
+    create_index('ix_booking_user_status')
+
+def resolve_duplicate_slots():
+    """Mark all but one active booking per slot as 'conflict'.
+
+    Slots double-booked by the old check-then-insert race would otherwise
+    fail the unique index. There is no creation time on old rows, so the
+    booking with the smallest id keeps the slot. The others are logged so
+    they can be followed up with their owners.
+    """
+    active = Booking.status.not_in(INACTIVE_STATUSES)
+    duplicates = db.session.execute(
+        db.select(Booking.date, Booking.time).where(active)
+        .group_by(Booking.date, Booking.time).having(db.func.count() > 1)
+    ).all()
+    for slot_date, slot_time in duplicates:
+        ids = db.session.scalars(
+            db.select(Booking.id).where(Booking.date == slot_date, Booking.time == slot_time, active)
+            .order_by(Booking.id)
+        ).all()
+        db_log.warning('double-booked slot', extra={
+            'date': slot_date.isoformat(), 'time': slot_time.strftime('%H:%M'),
+            'kept': ids[0], 'conflicts': ids[1:]
+        })
+        db.session.execute(
+            update(Booking).where(Booking.id.in_(ids[1:])).values(status='conflict'),
+            execution_options={'synchronize_session': False}
+        )
+    return len(duplicates)
+
+@migration(4, 'unique non-cancelled booking slot', provides={'booking.slot_unique'},
+           dialects=('postgresql', 'sqlite'))
+def add_booking_slot_unique_index():
+    resolve_duplicate_slots()
+    create_index('uq_booking_slot')
+
+@migration(5, 'booking per-user listing index')
+def add_booking_user_slot_index():
+    create_index('ix_booking_user_slot')
+
+class IdempotencyRecord(db.Model):
+    __tablename__ = 'idempotency_key'
+    key = db.Column(db.String(64), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer)
+    content_type = db.Column(db.String(255))
+    body = db.Column(db.LargeBinary)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
+
+@migration(6, 'idempotency keys', provides={'idempotency'})
+def add_idempotency_key_table():
+    IdempotencyRecord.__table__.create(db.session.connection(), checkfirst=True)
+
+@migration(7, 'add booking.version')
+def add_booking_version():
+    add_column('booking', 'version', {'default': 'INTEGER NOT NULL DEFAULT 1'})
+
+@migration(8, 'backfill booking.user_email', provides={'booking.user_email_backfilled'})
+def backfill_booking_user_email():
+    # Rows from before migration 1 are owned through their contact email.
+    db.session.execute(
+        update(Booking).where(Booking.user_email.is_(None)).values(user_email=Booking.email),
+        execution_options={'synchronize_session': False}
+    )
+
+def load_schema_state(applied_versions):
+    capabilities = set()
+    for m in MIGRATIONS:
+        if m['version'] in applied_versions and migration_supported(m):
+            capabilities |= m['provides']
+    schema_state.update({
+        'version': max(applied_versions, default=0),
+        'capabilities': frozenset(capabilities),
+        'loaded': True
+    })
+
+def run_migrations():
+    """Apply pending migrations in order and refresh the in-memory schema state.
+
+    Meant to run once at startup or deploy; request handlers only consult
+    schema_state. Returns the versions applied by this call.
+    """
+    applied_versions = {row.version for row in db.session.query(SchemaVersion.version)}
+    newly_applied = []
+    for m in MIGRATIONS:
+        if m['version'] in applied_versions:
+            continue
+        db_log.info('applying migration', extra={'version': m['version'], 'migration': m['name']})
         try:
-            print("Trying fallback migration method...")
-            db.session.execute(text('ALTER TABLE booking ADD COLUMN user_email VARCHAR(255)'))
+            if migration_supported(m):
+                m['apply']()
+            else:
+                db_log.info('skipping migration', extra={'version': m['version'], 'dialect': db.engine.dialect.name})
+            db.session.add(SchemaVersion(version=m['version'], name=m['name']))
             db.session.commit()
-            print("Successfully added user_email column using fallback method")
-        except Exception as fallback_error:
-            print(f"Fallback migration also failed: {fallback_error}")
+        except Exception as e:
+            db_log.exception('migration failed', extra={'version': m['version']})
             db.session.rollback()
+            break
+        applied_versions.add(m['version'])
+        newly_applied.append(m['version'])
+    load_schema_state(applied_versions)
+    return newly_applied
 
-with app.app_context():
+def upgrade_database():
+    """Create missing tables and apply pending migrations; run once per deploy."""
     db.create_all()
-    migrate_database()
+    return run_migrations()
+
+db_cli = AppGroup('db', help='Database schema commands.')
+
+@db_cli.command('upgrade')
+def db_upgrade_command():
+    """Create missing tables and apply pending migrations."""
+    applied = upgrade_database()
+    pending = [m['version'] for m in MIGRATIONS if m['version'] > schema_state['version']]
+    if pending:
+        raise click.ClickException(f"Migration failed; pending versions: {pending}")
+    click.echo(f"Applied {applied or 'nothing'}; schema version {schema_state['version']}")
+
+@db_cli.command('current')
+def db_current_command():
+    """Show the applied schema version and any pending migrations."""
+    load_schema_state({row.version for row in db.session.query(SchemaVersion.version)})
+    pending = [m['version'] for m in MIGRATIONS if m['version'] > schema_state['version']]
+    click.echo(f"Schema version {schema_state['version']}; pending: {pending or 'none'}")
+
+availability_cache = app_state('availability_cache')
+availability_lock = threading.Lock()
+availability_state = app_state('availability')
+availability_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def schedule_slots(service):
+    """Slot start times ('HH:MM') for a service's opening hours."""
+    # Unknown services share the default schedule, so ?service= can't grow the cache.
+    return schedule_slots_for(service if service in SERVICE_SCHEDULES else None)
+
+@lru_cache(maxsize=None)
+def schedule_slots_for(service):
+    schedule = SERVICE_SCHEDULES.get(service, DEFAULT_SCHEDULE)
+    current = datetime.strptime(schedule['open'], '%H:%M')
+    close = datetime.strptime(schedule['close'], '%H:%M')
+    step = timedelta(minutes=schedule['slot_minutes'])
+    slots = []
+    while current + step <= close:
+        slots.append(current.strftime('%H:%M'))
+        current += step
+    return tuple(slots)
+
+def booked_times(dates):
+    """Map each date to the set of booked 'HH:MM' slots.
+
+    Dates missing from the in-process cache are loaded with a single query over
+    their range. Entries live for AVAILABILITY_CACHE_TTL seconds at most, which
+    bounds staleness from writes made by other workers.
+    """
+    result = {}
+    missing = []
+    now = time.time()
+    with availability_lock:
+        for day in dates:
+            entry = availability_cache.get(day)
+            if entry and entry[0] > now:
+                availability_cache.move_to_end(day)
+                availability_stats['hits'] += 1
+                result[day] = entry[1]
+            else:
+                availability_stats['misses'] += 1
+                missing.append(day)
+        generation = availability_state['generation']
+
+    if not missing:
+        return result
+
+    fetched = {day: set() for day in missing}
+    rows = db.session.query(Booking.date, Booking.time).filter(
+        Booking.date.between(min(missing), max(missing)),
+        Booking.status.not_in(INACTIVE_STATUSES)
+    ).distinct()
+    for booked_date, booked_time in rows:
+        if booked_date in fetched:
+            fetched[booked_date].add(booked_time.strftime('%H:%M'))
+
+    with availability_lock:
+        # A write landed while we were querying; don't cache what may be stale.
+        cacheable = availability_state['generation'] == generation
+        for day, times in fetched.items():
+            result[day] = frozenset(times)
+            if cacheable:
+                availability_cache[day] = (now + AVAILABILITY_CACHE_TTL, result[day])
+                availability_cache.move_to_end(day)
+        while len(availability_cache) > AVAILABILITY_CACHE_SIZE:
+            availability_cache.popitem(last=False)
+    return result
+
+def invalidate_availability(*dates):
+    with availability_lock:
+        availability_state['generation'] += 1
+        for day in dates:
+            if availability_cache.pop(day, None) is not None:
+                availability_stats['invalidations'] += 1
+
+resource_versions = app_state('resource_versions')
+resource_versions_lock = threading.Lock()
+
+def current_version(key):
+    """Opaque version token for a resource key such as 'user:<email>' or 'date:<iso>'.
+
+    Tokens are random rather than counters so that workers, which each keep
+    their own table, never hand out the same token for different contents.
+    They also expire after VERSION_TTL_SECONDS, which bounds how long a
+    worker can answer 304 for a change made by another worker.
+    """
+    now = time.time()
+    with resource_versions_lock:
+        entry = resource_versions.get(key)
+        if entry is None or entry[1] <= now:
+            entry = (uuid.uuid4().hex[:12], now + VERSION_TTL_SECONDS)
+            resource_versions[key] = entry
+        resource_versions.move_to_end(key)
+        while len(resource_versions) > VERSION_CACHE_SIZE:
+            resource_versions.popitem(last=False)
+        return entry[0]
+
+def bump_versions(*keys):
+    with resource_versions_lock:
+        for key in keys:
+            resource_versions.pop(key, None)
+
+class RedisFragmentStore:
+    """Optional cache shared between workers; only holds content-addressed card fragments."""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=0.1)
+
+    def get(self, key):
+        value = self.client.get(f'booking-fragment:{key}')
+        return value.decode() if value is not None else None
+
+    def set(self, key, html):
+        self.client.set(f'booking-fragment:{key}', html, ex=FRAGMENT_CACHE_TTL)
+
+fragment_cache = app_state('fragment_cache')  # key -> (html, owner)
+fragment_owners = app_state('fragment_owners')  # owner -> keys
+fragment_lock = threading.Lock()
+fragment_state = app_state('fragment')
+fragment_stats = {'hits': 0, 'misses': 0, 'shared_hits': 0, 'invalidations': 0, 'shared_errors': 0}
+
+@lru_cache(maxsize=None)
+def card_template_version():
+    # Part of every card key so a deploy with a changed template never serves old HTML from Redis.
+    return hashlib.sha1(Path(__file__).with_name('templates').joinpath('booking_card.html').read_bytes()).hexdigest()[:8]
+
+def fragment_get(key, shared=False):
+    with fragment_lock:
+        entry = fragment_cache.get(key)
+        if entry is not None:
+            fragment_cache.move_to_end(key)
+            fragment_stats['hits'] += 1
+            return entry[0]
+    html = None
+    store = fragment_state['shared'] if shared else None
+    if store is not None:
+        try:
+            html = store.get(key)
+        except Exception as e:
+            fragment_stats['shared_errors'] += 1
+            log.warning('shared fragment cache unavailable', extra={'error': str(e)})
+        if html is not None:
+            fragment_stats['shared_hits'] += 1
+            return html
+    fragment_stats['misses'] += 1
+    return None
+
+def fragment_put(key, html, owner, shared=False):
+    """Cache rendered HTML; `owner` (a booking id or user) is what invalidates it."""
+    with fragment_lock:
+        fragment_cache[key] = (html, owner)
+        fragment_cache.move_to_end(key)
+        fragment_owners.setdefault(owner, set()).add(key)
+        while len(fragment_cache) > FRAGMENT_CACHE_SIZE:
+            evicted, (_, evicted_owner) = fragment_cache.popitem(last=False)
+            keys = fragment_owners.get(evicted_owner)
+            if keys is not None:
+                keys.discard(evicted)
+                if not keys:
+                    del fragment_owners[evicted_owner]
+    store = fragment_state['shared'] if shared else None
+    if store is not None:
+        try:
+            store.set(key, html)
+        except Exception as e:
+            fragment_stats['shared_errors'] += 1
+            log.warning('shared fragment cache unavailable', extra={'error': str(e)})
+
+def invalidate_fragments(*owners, keep=()):
+    """Drop every fragment of the given owners except the keys in `keep`."""
+    with fragment_lock:
+        for owner in owners:
+            keys = fragment_owners.pop(owner, set())
+            kept = keys & set(keep)
+            if kept:
+                fragment_owners[owner] = kept
+            for key in keys - kept:
+                if fragment_cache.pop(key, None) is not None:
+                    fragment_stats['invalidations'] += 1
+
+def card_key(booking):
+    return f"card:{booking['id']}:{booking['version']}:{card_template_version()}"
+
+def render_booking_card(booking):
+    """booking_card.html for a booking dict, keyed by id and row version."""
+    key = card_key(booking)
+    html = fragment_get(key, shared=True)
+    if html is None:
+        html = render_template('booking_card.html', booking=booking)
+        fragment_put(key, html, booking['id'], shared=True)
+    return Markup(html)
+
+class LocalEventBackend:
+    """Delivers booking events to handlers in this process only."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def subscribe(self, handler):
+        self.handlers.append(handler)
+
+    def dispatch(self, event):
+        for handler in self.handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                events_log.exception('event handler failed', extra={'event': event.get('type')})
+
+    def publish(self, event):
+        self.dispatch(event)
+
+class PostgresEventBackend(LocalEventBackend):
+    """Shares booking events between workers with PostgreSQL LISTEN/NOTIFY.
+
+    Events are dispatched locally as soon as they are published; the
+    listener thread only dispatches events that came from other processes.
+    NOTIFY payloads must stay under 8000 bytes, so bookings are sent as
+    id and version only, and large events are split over several
+    notifications. Receiving workers reload the bookings when one of their
+    streams needs them.
+    """
+    channel = 'booking_events'
+    payload_limit = 7900
+
+    def __init__(self, dsn, app):
+        super().__init__()
+        self.dsn = dsn
+        self.app = app
+        self.origin = uuid.uuid4().hex
+        self.listener = None
+
+    def subscribe(self, handler):
+        super().subscribe(handler)
+        if self.listener is None:
+            self.listener = threading.Thread(target=self.listen, name='event-listener', daemon=True)
+            self.listener.start()
+
+    def payloads(self, event):
+        """NOTIFY payloads for an event, halving its lists until each one fits."""
+        payload = json.dumps(event)
+        lists = ('bookings', 'booked', 'released')
+        if len(payload.encode()) <= self.payload_limit or sum(len(event[name]) for name in lists) <= 1:
+            return [payload]
+        halves = [dict(event), dict(event)]
+        for name in lists:
+            middle = (len(event[name]) + 1) // 2
+            halves[0][name], halves[1][name] = event[name][:middle], event[name][middle:]
+        return self.payloads(halves[0]) + self.payloads(halves[1])
+
+    def publish(self, event):
+        self.dispatch(event)
+        compact = dict(event, origin=self.origin, bookings=[
+            {'id': booking['id'], 'version': booking['version']} for booking in event['bookings']
+        ])
+        try:
+            with db.engine.connect() as conn:
+                for payload in self.payloads(compact):
+                    conn.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': self.channel, 'payload': payload})
+                conn.commit()
+        except Exception as e:
+            events_log.error('event publish failed', extra={'error': str(e)})
+
+    def load_bookings(self, event):
+        """Replace the id/version stubs of a remote event with full booking dicts; needs an app context."""
+        with event_streams_lock:
+            wanted = any(stream.user_email == event['user_email'] for stream in event_streams)
+        if not wanted or not event['bookings']:
+            return event
+        ids = [booking['id'] for booking in event['bookings']]
+        try:
+            rows = db.session.execute(db.select(*booking_columns()).where(Booking.id.in_(ids))).all()
+        except Exception as e:
+            events_log.warning('event bookings reload failed', extra={'error': str(e)})
+            return event
+        return dict(event, bookings=[booking_row_dict(row) for row in rows])
+
+    def listen(self):
+        import psycopg2
+        import psycopg2.extensions
+        while True:
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f'LISTEN {self.channel}')
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        event = json.loads(conn.notifies.pop(0).payload)
+                        if event.pop('origin', None) != self.origin:
+                            with self.app.app_context():
+                                self.dispatch(self.load_bookings(event))
+            except Exception as e:
+                events_log.warning('event listener reconnecting', extra={'error': str(e)})
+                time.sleep(5)
+
+def make_event_backend(app):
+    if app.config['EVENT_BACKEND'] == 'postgres':
+        from sqlalchemy.engine import make_url
+        dsn = make_url(app.config['SQLALCHEMY_DATABASE_URI']).set(drivername='postgresql').render_as_string(hide_password=False)
+        return PostgresEventBackend(dsn, app)
+    return LocalEventBackend()
+
+def booking_changed(event_type, user_email, bookings, booked=(), released=()):
+    """Publish a booking mutation; every worker invalidates its caches from it.
+
+    `booked` and `released` are the (date, time) slots taken and freed.
+    """
+    def slot_list(slots):
+        return [[day.isoformat(), slot_time.strftime('%H:%M')] for day, slot_time in slots]
+
+    current_app.extensions['booking_events'].publish({
+        'type': event_type,
+        'user_email': user_email,
+        'bookings': bookings,
+        'booked': slot_list(booked),
+        'released': slot_list(released)
+    })
+
+def apply_booking_event(event):
+    dates = {day for day, _ in event['booked'] + event['released']}
+    invalidate_availability(*(parse_booking_date(day) for day in dates))
+    bump_versions(f"user:{event['user_email']}", *(f'date:{day}' for day in dates))
+    # Cards of the bookings' current contents stay cached for the swap that follows.
+    invalidate_fragments(event['user_email'], *(booking['id'] for booking in event['bookings']),
+                         keep=[card_key(booking) for booking in event['bookings']])
+
+class EventStream:
+    def __init__(self, user_email):
+        self.user_email = user_email
+        self.queue = queue.Queue(maxsize=EVENT_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, name, data):
+        try:
+            self.queue.put_nowait((name, data))
+        except queue.Full:
+            self.overflowed = True
+
+event_streams = app_state('event_streams')
+event_streams_lock = threading.Lock()
+
+def fan_out_booking_event(event):
+    """Send booking deltas to the owner's streams and slot deltas to everyone."""
+    with event_streams_lock:
+        streams = list(event_streams)
+    slots = {'booked': event['booked'], 'released': event['released']}
+    for stream in streams:
+        if stream.user_email == event['user_email']:
+            for booking in event['bookings']:
+                stream.offer(event['type'], booking)
+        if slots['booked'] or slots['released']:
+            stream.offer('slots.changed', slots)
+
+def etag_cached(version_keys):
+    """Answer If-None-Match with 304 from version tokens alone, before running the view.
+
+    The ETag also covers the full path (filters, cursor) and the browser's
+    last write time, so users see their own mutations immediately whichever
+    worker served them.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                keys = version_keys(*args, **kwargs)
+            except ValueError:
+                # Let the view report the bad request.
+                return f(*args, **kwargs)
+            parts = [f'{key}={current_version(key)}' for key in keys]
+            parts.append(str(session.get('last_write_at', 0)))
+            parts.append(request.full_path)
+            etag = hashlib.sha1('|'.join(parts).encode()).hexdigest()[:20]
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+def available_slots(dates, service=None):
+    booked = booked_times(dates)
+    return {
+        day.isoformat(): [slot for slot in schedule_slots(service) if slot not in booked[day]]
+        for day in dates
+    }
+
+identity_stats = {'hits': 0, 'misses': 0, 'failures': 0}
+identity_stats_lock = threading.Lock()
+
+def count_identity(outcome):
+    with identity_stats_lock:
+        identity_stats[outcome] += 1
+
+def current_token_key():
+    token = google.token or {}
+    access_token = token.get('access_token')
+    if not access_token:
+        return None
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+def resolve_identity(force=False):
+    """Return the signed-in Google user, calling userinfo only when needed.
+
+    The resolved identity is kept in the session together with a hash of the
+    access token it was fetched with, so it is revalidated only when the token
+    changes or the entry is older than IDENTITY_TTL_SECONDS.
+    """
+    token_key = current_token_key()
+    if not token_key:
+        return None
+
+    cached = session.get('identity')
+    if (not force and cached and cached.get('token') == token_key
+            and cached.get('expires_at', 0) > time.time()):
+        count_identity('hits')
+        return cached['user']
+
+    count_identity('misses')
+    started = time.perf_counter()
+    resp = google.get("/oauth2/v2/userinfo")
+    observe_google_call('userinfo', time.perf_counter() - started)
+    if not resp.ok:
+        count_identity('failures')
+        auth_log.warning('userinfo request failed', extra={'status': resp.status_code})
+        session.pop('identity', None)
+        return None
+
+    user_info = resp.json()
+    user_email = user_info.get('email')
+
+    user = {
+        'name': user_info.get('name', ''),
+        'email': user_email,
+        'picture': user_info.get('picture')
+    }
+    session['identity'] = {
+        'token': token_key,
+        'expires_at': time.time() + IDENTITY_TTL_SECONDS,
+        'user': user
+    }
+    session['google_email'] = user_email
+    session['google_avatar'] = user['picture']
+    session['user_info'] = user
+    # Warm the avatar cache in the background so the first page view can use it.
+    cache_google_avatar(user['picture'], user_email)
+    return user
 
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
+        is_api = request.path.startswith('/api/') or request.headers.get('HX-Request')
         if not google.authorized:
-            if request.path.startswith('/api/') or request.headers.get('HX-Request'):
+            if is_api:
                 return jsonify({'error': 'Authentication required'}), 401
-            return redirect(url_for('login'))
+            return redirect(url_for('.login'))
+        g.user = resolve_identity()
+        if g.user is None and is_api:
+            return jsonify({'error': 'Failed to get user info'}), 401
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/')
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_PURGE_EVERY = 500
+
+idempotency_inflight = app_state('idempotency_inflight')
+idempotency_lock = threading.Lock()
+idempotency_stats = {'stored': 0, 'replayed': 0, 'coalesced': 0, 'conflicts': 0}
+
+def stored_response(record):
+    response = current_app.response_class(record.body, status=record.status_code, content_type=record.content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def claim_idempotency_key(record_key, request_hash):
+    """Insert an in-flight record; returns the existing record if another request holds the key."""
+    now = time.time()
+    db.session.add(IdempotencyRecord(key=record_key, request_hash=request_hash,
+                                     expires_at=now + IDEMPOTENCY_TTL_SECONDS))
+    try:
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+    existing = db.session.get(IdempotencyRecord, record_key)
+    if existing is not None and existing.expires_at <= now:
+        db.session.delete(existing)
+        db.session.commit()
+        return claim_idempotency_key(record_key, request_hash)
+    return existing
+
+def wait_for_idempotent_result(record_key):
+    """Wait for the request holding the key to finish; returns its record, or None on timeout."""
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        with idempotency_lock:
+            done = idempotency_inflight.get(record_key)
+        if done is not None:
+            done.wait(max(deadline - time.monotonic(), 0))
+        db.session.expire_all()
+        record = db.session.get(IdempotencyRecord, record_key)
+        if record is None or record.status_code is not None or time.monotonic() >= deadline:
+            return record
+        # Held by another worker: poll.
+        time.sleep(0.05)
+
+def idempotent(f):
+    """Honour an Idempotency-Key header on a mutation.
+
+    The first request with a key runs the view and stores its response for
+    IDEMPOTENCY_TTL_SECONDS. Repeats with the same key and body get that response
+    back before identity lookup, validation or writes. Duplicates that arrive
+    while the first is still running wait for it instead of racing it. Responses
+    that are 5xx or 401 are not stored, so those requests can be retried.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key or not has_capability('idempotency'):
+            return f(*args, **kwargs)
+        if len(idempotency_key) > 255:
+            return jsonify({'error': 'Idempotency-Key must be at most 255 characters'}), 400
+        # Keys are scoped to the caller's OAuth token, which needs no call to Google.
+        scope = current_token_key()
+        if scope is None:
+            return f(*args, **kwargs)
+
+        record_key = hashlib.sha256(f'{scope}|{request.method}|{request.path}|{idempotency_key}'.encode()).hexdigest()
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        existing = claim_idempotency_key(record_key, request_hash)
+        if existing is not None:
+            if existing.request_hash != request_hash:
+                idempotency_stats['conflicts'] += 1
+                return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+            if existing.status_code is None:
+                idempotency_stats['coalesced'] += 1
+                existing = wait_for_idempotent_result(record_key)
+            if existing is None:
+                # The first attempt failed and released the key; run this one instead.
+                return decorated_function(*args, **kwargs)
+            if existing.status_code is None:
+                return jsonify({'error': 'A request with this Idempotency-Key is still in progress'}), 409
+            idempotency_stats['replayed'] += 1
+            return stored_response(existing)
+
+        done = threading.Event()
+        with idempotency_lock:
+            idempotency_inflight[record_key] = done
+        try:
+            response = make_response(f(*args, **kwargs))
+            db.session.rollback()
+            record = db.session.get(IdempotencyRecord, record_key)
+            if response.status_code >= 500 or response.status_code == 401:
+                db.session.delete(record)
+            else:
+                record.status_code = response.status_code
+                record.content_type = response.content_type
+                record.body = response.get_data()
+                idempotency_stats['stored'] += 1
+            db.session.commit()
+            return response
+        except Exception:
+            db.session.rollback()
+            IdempotencyRecord.query.filter_by(key=record_key).delete()
+            db.session.commit()
+            raise
+        finally:
+            with idempotency_lock:
+                idempotency_inflight.pop(record_key, None)
+            done.set()
+            if random.randrange(IDEMPOTENCY_PURGE_EVERY) == 0:
+                purge_idempotency_keys()
+    return decorated_function
+
+def purge_idempotency_keys():
+    try:
+        IdempotencyRecord.query.filter(IdempotencyRecord.expires_at <= time.time()).delete()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        db_log.warning('idempotency key purge failed', extra={'error': str(e)})
+
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+EXPORT_API_TOKEN = os.getenv('EXPORT_API_TOKEN')
+
+def admin_required(f):
+    """Allow scheduled jobs holding EXPORT_API_TOKEN, or a signed-in user listed in ADMIN_EMAILS."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        authorization = request.headers.get('Authorization', '')
+        if (EXPORT_API_TOKEN and authorization.startswith('Bearer ')
+                and hmac.compare_digest(authorization[len('Bearer '):], EXPORT_API_TOKEN)):
+            return f(*args, **kwargs)
+        if not google.authorized:
+            return jsonify({'error': 'Authentication required'}), 401
+        g.user = resolve_identity()
+        if g.user is None:
+            return jsonify({'error': 'Failed to get user info'}), 401
+        if (g.user.get('email') or '').lower() not in ADMIN_EMAILS:
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def read_only(f):
+    """Route the handler's queries to the replica, unless this browser wrote recently.
+
+    Reads stay on the primary for REPLICA_STICKY_SECONDS after a mutation so
+    users always see their own writes despite replication lag.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = time.time() - session.get('last_write_at', 0) >= REPLICA_STICKY_SECONDS
+        return f(*args, **kwargs)
+    return decorated_function
+
+@bp.after_app_request
+def remember_write(response):
+    if g.get('db_write'):
+        session['last_write_at'] = time.time()
+    return response
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_SLOW_LOG_STATEMENTS = 10
+
+metrics_lock = threading.Lock()
+request_latency = {}
+request_status = {}
+request_sql = {}
+google_latency = {}
+
+def observe_histogram(histogram, labels, value):
+    # Caller holds metrics_lock.
+    entry = histogram.setdefault(labels, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if value <= bound:
+            entry['buckets'][i] += 1
+    entry['sum'] += value
+    entry['count'] += 1
+
+def observe_google_call(call, seconds):
+    with metrics_lock:
+        observe_histogram(google_latency, (call,), seconds)
+    if has_request_context() and 'google_seconds' in g:
+        g.google_seconds += seconds
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += seconds
+        g.sql_statements.append((seconds, ' '.join(statement.split())[:160]))
+
+@event.listens_for(Engine, 'handle_error')
+def discard_query_timer(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+REQUEST_ID_CHARS = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_.')
+
+@bp.before_app_request
+def assign_request_id():
+    # Honour an upstream proxy's ID so one flow can be traced end to end.
+    incoming = request.headers.get('X-Request-ID', '')
+    if not incoming or len(incoming) > 64 or not set(incoming) <= REQUEST_ID_CHARS:
+        incoming = uuid.uuid4().hex
+    g.request_id = incoming
+    g.request_id_token = request_id_var.set(incoming)
+
+@bp.teardown_app_request
+def clear_request_id(exc):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@bp.before_app_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+    g.sql_statements = []
+    g.google_seconds = 0.0
+
+@bp.before_app_request
+def ensure_schema_state():
+    # Workers read the applied migrations on their first request instead of at import,
+    # so they boot without a database and retry here if it was unreachable.
+    if schema_state['loaded']:
+        return
+    try:
+        load_schema_state({row.version for row in db.session.query(SchemaVersion.version)})
+    except Exception as e:
+        db.session.rollback()
+        db_log.warning('could not load schema version', extra={'error': str(e)})
+
+@bp.after_app_request
+def record_request_metrics(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    if 'request_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_started
+    route = request.endpoint or 'unmatched'
+    with metrics_lock:
+        observe_histogram(request_latency, (route, request.method), elapsed)
+        status_key = (route, request.method, str(response.status_code))
+        request_status[status_key] = request_status.get(status_key, 0) + 1
+        sql = request_sql.setdefault(route, {'queries': 0, 'seconds': 0.0})
+        sql['queries'] += g.sql_count
+        sql['seconds'] += g.sql_seconds
+
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        http_log.warning('slow request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 1),
+            'sql_count': g.sql_count,
+            'sql_ms': round(g.sql_seconds * 1000, 1),
+            'google_ms': round(g.google_seconds * 1000, 1),
+            'slowest_sql': [
+                {'ms': round(seconds * 1000, 1), 'statement': statement}
+                for seconds, statement in sorted(g.sql_statements, reverse=True)[:MAX_SLOW_LOG_STATEMENTS]
+            ]
+        })
+    else:
+        http_log.debug('request', extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 1),
+            'sql_count': g.sql_count
+        })
+    return response
+
+def format_labels(names, values):
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{escaped}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def render_histogram(lines, name, help_text, histogram, label_names):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, entry in sorted(histogram.items()):
+        for bound, count in zip(LATENCY_BUCKETS, entry['buckets']):
+            lines.append(f"{name}_bucket{format_labels(label_names + ('le',), labels + (bound,))} {count}")
+        lines.append(f"{name}_bucket{format_labels(label_names + ('le',), labels + ('+Inf',))} {entry['count']}")
+        lines.append(f"{name}_sum{format_labels(label_names, labels)} {entry['sum']}")
+        lines.append(f"{name}_count{format_labels(label_names, labels)} {entry['count']}")
+
+def render_samples(lines, name, metric_type, help_text, samples, label_names=()):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {metric_type}')
+    for labels, value in samples:
+        lines.append(f"{name}{format_labels(label_names, labels)} {value}")
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with metrics_lock:
+        render_histogram(lines, 'booking_http_request_duration_seconds', 'Request latency by route.',
+                         request_latency, ('route', 'method'))
+        render_samples(lines, 'booking_http_requests_total', 'counter', 'Responses by route and status.',
+                       sorted(request_status.items()), ('route', 'method', 'status'))
+        render_samples(lines, 'booking_sql_queries_total', 'counter', 'SQL statements executed by route.',
+                       [((route,), v['queries']) for route, v in sorted(request_sql.items())], ('route',))
+        render_samples(lines, 'booking_sql_seconds_total', 'counter', 'Time spent in SQL by route.',
+                       [((route,), v['seconds']) for route, v in sorted(request_sql.items())], ('route',))
+        render_histogram(lines, 'booking_google_request_duration_seconds', 'Outbound Google API latency.',
+                         google_latency, ('call',))
+    render_samples(lines, 'booking_identity_cache_total', 'counter', 'Identity lookups by outcome.',
+                   [((k,), v) for k, v in sorted(identity_stats.items())], ('outcome',))
+    render_samples(lines, 'booking_availability_cache_total', 'counter', 'Availability cache events.',
+                   [((k,), v) for k, v in sorted(availability_stats.items())], ('event',))
+    render_samples(lines, 'booking_avatar_cache_total', 'counter', 'Avatar cache events, including downloads.',
+                   [((k,), v) for k, v in sorted(avatar_stats.items())], ('event',))
+    render_samples(lines, 'booking_fragment_cache_total', 'counter', 'HTMX fragment cache events.',
+                   [((k,), v) for k, v in sorted(fragment_stats.items())], ('event',))
+    render_samples(lines, 'booking_avatar_cache_bytes', 'gauge', 'Bytes of cached avatars on disk.',
+                   [((), avatar_state['bytes'])])
+    render_samples(lines, 'booking_event_streams', 'gauge', 'Open Server-Sent Events streams.',
+                   [((), len(event_streams))])
+    render_samples(lines, 'booking_log_records_total', 'counter', 'Log records discarded before output.',
+                   [((k,), v) for k, v in sorted(log_stats.items())], ('outcome',))
+    pools = pool_metrics()
+    for metric, key, metric_type, help_text in (
+            ('booking_db_pool_checkouts_total', 'checkouts', 'counter', 'Connection checkouts.'),
+            ('booking_db_pool_wait_seconds_total', 'wait_seconds', 'counter', 'Time spent waiting for a connection.'),
+            ('booking_db_pool_timeouts_total', 'timeouts', 'counter', 'Checkouts that failed waiting.'),
+            ('booking_db_pool_checked_out', 'checked_out', 'gauge', 'Connections currently checked out.'),
+            ('booking_db_pool_utilization', 'utilization', 'gauge', 'Checked-out share of pool capacity.')):
+        render_samples(lines, metric, metric_type, help_text,
+                       [((bind,), stats[key]) for bind, stats in sorted(pools.items()) if stats.get(key) is not None],
+                       ('bind',))
+    return '\n'.join(lines) + '\n'
+
+def pool_metrics():
+    metrics = {}
+    for bind_key, engine in db.engines.items():
+        pool = engine.pool
+        capacity = getattr(pool, 'size', lambda: 0)() + max(getattr(pool, '_max_overflow', 0), 0)
+        checked_out = pool.checkedout() if hasattr(pool, 'checkedout') else 0
+        metrics[bind_key or 'primary'] = dict(
+            getattr(pool, 'wait_stats', {}),
+            checked_out=checked_out,
+            utilization=round(checked_out / capacity, 3) if capacity else None
+        )
+    return metrics
+
+@bp.route('/')
 @login_required
 def index():
-    user_info = None
-    google_avatar = None
-    if google.authorized:
-        resp = google.get("/oauth2/v2/userinfo")
-        if resp.ok:
-            user_info = resp.json()
-            google_avatar_url = user_info.get("picture")
-            user_email = user_info.get('email')
-            
-            cached_avatar = cache_google_avatar(google_avatar_url, user_email)
-            
-            session['google_email'] = user_email
-            session['google_avatar'] = cached_avatar or google_avatar_url
-            session['user_info'] = {
-                'name': user_info.get('name', ''),
-                'email': user_email,
-                'picture': cached_avatar or google_avatar_url
-            }
-    return render_template('index.html', user_info=user_info, google_avatar=google_avatar)
+    return render_template('index.html', user_info=display_user(g.user), google_avatar=None)
 
-@app.route('/login')
+@bp.route('/login')
 def login():
     if google.authorized:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('login'))
+    return redirect(url_for('.login'))
 
-@app.route('/login/google/authorized')
-def google_authorized():
-    if not google.authorized:
-        print("Google authorization failed")
-        return redirect(url_for("login"))
-    
+@oauth_authorized.connect_via(google_bp)
+def google_logged_in(blueprint, token):
+    """Store the token and resolve the identity once, when Google redirects back."""
+    if not token:
+        auth_log.warning('google authorization failed')
+        return redirect(url_for('booking.login'))
+    blueprint.token = token
     try:
-        resp = google.get("/oauth2/v2/userinfo")
-        if not resp.ok:
-            print(f"Failed to fetch user info: {resp.text}")
-            return "Failed to fetch user info.", 400
-        
-        user_info = resp.json()
-        user_email = user_info.get('email')
-        google_avatar_url = user_info.get('picture')
-        
-        cached_avatar = cache_google_avatar(google_avatar_url, user_email)
-        
-        session['google_email'] = user_email
-        session['google_avatar'] = cached_avatar or google_avatar_url
-        session['user_info'] = {
-            'name': user_info.get('name', ''),
-            'email': user_email,
-            'picture': cached_avatar or google_avatar_url
-        }
-        
-        print(f"Successfully logged in user: {user_email}")
-        return redirect(url_for("index", login_success="true"))
+        user = resolve_identity(force=True)
+        if user is None:
+            del blueprint.token
+            return current_app.response_class('Failed to fetch user info.', status=400)
+
+        auth_log.info('user logged in', extra={'user': user_ref(user['email'])})
+        return redirect(url_for('booking.index', login_success='true'))
     except Exception as e:
-        print(f"Error during Google OAuth: {str(e)}")
-        return redirect(url_for("login"))
+        auth_log.exception('google oauth failed')
+        return redirect(url_for('booking.login'))
 
-@app.route('/api/user-info')
+@bp.route('/api/user-info')
 @login_required
 def get_user_info():
-    if google.authorized:
-        resp = google.get("/oauth2/v2/userinfo")
-        if resp.ok:
-            user_info = resp.json()
-            user_email = user_info.get('email')
-            google_avatar_url = user_info.get('picture')
-            
-            cached_avatar = cache_google_avatar(google_avatar_url, user_email)
-            
-            return jsonify({
-                'name': user_info.get('name', ''),
-                'email': user_email,
-                'picture': cached_avatar or google_avatar_url
-            })
-    return jsonify({'error': 'User not authenticated'}), 401
+    return jsonify(display_user(g.user))
+
+def owned_by(user_email):
+    # A plain equality lets ix_booking_user_slot supply the listing order.
+    if has_capability('booking.user_email_backfilled'):
+        return Booking.user_email == user_email
+    if has_capability('booking.user_email'):
+        return (Booking.user_email == user_email) | (
+            (Booking.user_email.is_(None)) & (Booking.email == user_email))
+    return Booking.email == user_email
+
+BOOKING_FIELDS = ('id', 'service', 'date', 'time', 'name', 'email', 'phone', 'notes', 'status', 'user_email', 'version')
+JSON_STREAM_MIN_ROWS = int(os.getenv('JSON_STREAM_MIN_ROWS', '100'))
+JSON_STREAM_CHUNK_ROWS = int(os.getenv('JSON_STREAM_CHUNK_ROWS', '50'))
 
-@app.route('/api/bookings', methods=['GET'])
+if orjson is not None:
+    def dumps_json(value):
+        return orjson.dumps(value)
+else:
+    def dumps_json(value):
+        return json.dumps(value, separators=(',', ':')).encode()
+
+def booking_columns():
+    return [getattr(Booking, name) for name in BOOKING_FIELDS]
+
+def booking_row_dict(row):
+    """Booking.to_dict() for a row selected with booking_columns()."""
+    booking_id, service, booking_date, booking_time, name, email, phone, notes, status, user_email, version = row
+    return {
+        'id': booking_id,
+        'service': service,
+        'date': booking_date.isoformat(),
+        'time': booking_time.strftime('%H:%M'),
+        'name': name,
+        'email': email,
+        'phone': phone,
+        'notes': notes,
+        'status': status,
+        'user_email': user_email,
+        'version': version
+    }
+
+def encode_booking_row(row):
+    return dumps_json(booking_row_dict(row))
+
+def json_list_chunks(list_key, rows, encode_row, extra=None):
+    """Encode {list_key: [rows...], **extra} as a sequence of byte chunks."""
+    yield b'{' + dumps_json(list_key) + b':['
+    rows = iter(rows)
+    separator = b''
+    while True:
+        chunk = list(islice(rows, JSON_STREAM_CHUNK_ROWS))
+        if not chunk:
+            break
+        yield separator + b','.join(map(encode_row, chunk))
+        separator = b','
+    yield b'],' + dumps_json(extra)[1:] if extra else b']}'
+
+def json_list_response(list_key, rows, encode_row, extra=None):
+    """JSON response for a list of rows, streamed in chunks once it gets large."""
+    chunks = json_list_chunks(list_key, rows, encode_row, extra)
+    if len(rows) < JSON_STREAM_MIN_ROWS:
+        chunks = b''.join(chunks)
+    return current_app.response_class(chunks, mimetype='application/json')
+
+def encode_cursor(booking):
+    key = [booking.date.isoformat(), booking.time.strftime('%H:%M'), booking.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_value, time_value, booking_id = json.loads(base64.urlsafe_b64decode(padded))
+        return parse_booking_date(date_value), parse_booking_time(time_value), booking_id
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+def listing_filters(args):
+    """Validated listing filters from query args; raises ValueError on bad input."""
+    filters = {}
+    if args.get('from'):
+        filters['from'] = parse_booking_date(args['from'])
+    if args.get('to'):
+        filters['to'] = parse_booking_date(args['to'])
+    if args.get('service'):
+        filters['service'] = args['service']
+    if args.get('status'):
+        filters['status'] = args['status']
+    if args.get('cursor'):
+        filters['cursor'] = decode_cursor(args['cursor'])
+    limit = int(args.get('limit', BOOKINGS_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    filters['limit'] = min(limit, MAX_BOOKINGS_PAGE_SIZE)
+    return filters
+
+def bookings_page(user_email, filters):
+    """One page of a user's bookings ordered by (date, time, id).
+
+    Uses keyset pagination so the cost of a page doesn't depend on how many
+    bookings come before it. Rows are plain tuples of booking_columns()
+    rather than Booking instances. Returns (rows, next_cursor).
+    """
+    query = db.select(*booking_columns()).filter(owned_by(user_email))
+    if 'status' in filters:
+        query = query.filter(Booking.status == filters['status'])
+    else:
+        query = query.filter(Booking.status != 'cancelled')
+    if 'service' in filters:
+        query = query.filter(Booking.service == filters['service'])
+    if 'from' in filters:
+        query = query.filter(Booking.date >= filters['from'])
+    if 'to' in filters:
+        query = query.filter(Booking.date <= filters['to'])
+    if 'cursor' in filters:
+        query = query.filter(tuple_(Booking.date, Booking.time, Booking.id) > tuple_(*filters['cursor']))
+
+    limit = filters['limit']
+    bookings = db.session.execute(query.order_by(Booking.date, Booking.time, Booking.id).limit(limit + 1)).all()
+    next_cursor = encode_cursor(bookings[limit - 1]) if len(bookings) > limit else None
+    return bookings[:limit], next_cursor
+
+@bp.route('/api/bookings', methods=['GET'])
 @login_required
+@read_only
+@etag_cached(lambda: [f"user:{g.user['email']}"])
 def get_bookings():
-    if not google.authorized:
-        return jsonify({'error': 'User not authenticated'}), 401
-    
-    ensure_migration()
-    
-    resp = google.get("/oauth2/v2/userinfo")
-    if not resp.ok:
-        return jsonify({'error': 'Failed to get user info'}), 401
-    
-    user_info = resp.json()
-    user_email = user_info.get('email')
-    
     try:
-        if column_exists('booking', 'user_email'):
-            bookings = Booking.query.filter(
-                (Booking.user_email == user_email) | 
-                ((Booking.user_email.is_(None)) & (Booking.email == user_email)),
-                Booking.status != 'cancelled'
-            ).all()
-        else:
-            bookings = Booking.query.filter(
-                Booking.email == user_email,
-                Booking.status != 'cancelled'
-            ).all()
-    except Exception as e:
-        print(f"Warning: Error in user-specific booking query, falling back to email-only: {e}")
-        bookings = Booking.query.filter(
-            Booking.email == user_email,
-            Booking.status != 'cancelled'
-        ).all()
+        filters = listing_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([b.to_dict() for b in bookings])
+    bookings, next_cursor = bookings_page(g.user['email'], filters)
+    return json_list_response('bookings', bookings, encode_booking_row, {'next_cursor': next_cursor})
+
+REQUIRED_BOOKING_FIELDS = ['service', 'date', 'time', 'name', 'email', 'phone']
+ULID_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+booking_id_lock = threading.Lock()
+booking_id_state = {'ms': 0, 'random': 0}
+
+def new_booking_id():
+    """'BK' followed by a 26-character ULID: a 48-bit millisecond timestamp, then 80 random bits.
+
+    IDs sort by creation time and need no coordination between workers. Within
+    one millisecond (or if the clock steps back) the random part is incremented,
+    so IDs from one process are strictly increasing. Older 'BK' + 8 hex IDs stay
+    valid; they are only looked up by exact match and sort apart from these.
+    """
+    with booking_id_lock:
+        ms = int(time.time() * 1000)
+        if ms <= booking_id_state['ms']:
+            ms = booking_id_state['ms']
+            random_bits = booking_id_state['random'] + 1
+            if random_bits >= 1 << 80:
+                ms += 1
+                random_bits = int.from_bytes(os.urandom(10), 'big')
+        else:
+            random_bits = int.from_bytes(os.urandom(10), 'big')
+        booking_id_state.update(ms=ms, random=random_bits)
 
-@app.route('/api/bookings', methods=['POST'])
+    value = (ms << 80) | random_bits
+    chars = []
+    for _ in range(26):
+        chars.append(ULID_ALPHABET[value & 31])
+        value >>= 5
+    return 'BK' + ''.join(reversed(chars))
+
+def booking_values(data, user_email):
+    """Column values for a new booking; raises ValueError if `data` is invalid."""
+    if not isinstance(data, dict):
+        raise ValueError('Booking must be a JSON object')
+    for field in REQUIRED_BOOKING_FIELDS:
+        if not data.get(field):
+            raise ValueError(f'Missing required field: {field}')
+        if not isinstance(data[field], str):
+            raise ValueError(f'{field} must be a string')
+    notes = data.get('notes') or ''
+    if not isinstance(notes, str):
+        raise ValueError('notes must be a string')
+    try:
+        booking_date = parse_booking_date(data['date'])
+        booking_time = parse_booking_time(data['time'])
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date or time')
+
+    values = {
+        'id': new_booking_id(),
+        'service': data['service'],
+        'date': booking_date,
+        'time': booking_time,
+        'name': data['name'],
+        'email': data['email'],
+        'phone': data['phone'],
+        'notes': notes,
+        'status': 'confirmed',
+        'version': 1
+    }
+    if has_capability('booking.user_email'):
+        values['user_email'] = user_email
+    return values
+
+def booked_slots(slots):
+    """The subset of (date, time) pairs already taken by active bookings."""
+    if not slots:
+        return set()
+    rows = db.session.query(Booking.date, Booking.time).filter(
+        tuple_(Booking.date, Booking.time).in_(list(slots)),
+        Booking.status.not_in(INACTIVE_STATUSES)
+    )
+    return {(booked_date, booked_time) for booked_date, booked_time in rows}
+
+@bp.route('/api/bookings', methods=['POST'])
+@idempotent
 @login_required
 def create_booking():
     try:
-        print("=== BOOKING REQUEST RECEIVED ===")
-        
-        ensure_migration()
-        
         data = request.get_json()
-        print(f"Received data: {data}")
         
-        resp = google.get("/oauth2/v2/userinfo")
-        if not resp.ok:
-            return jsonify({'error': 'Failed to get user info'}), 401
-        
-        user_info = resp.json()
-        user_email = user_info.get('email')
-        
-        required_fields = ['service', 'date', 'time', 'name', 'email', 'phone']
-        for field in required_fields:
-            if not data.get(field):
-                print(f"Missing field: {field}")
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        user_email = g.user['email']
         
         try:
-            existing_booking = Booking.query.filter_by(date=data['date'], time=data['time']).filter(Booking.status != 'cancelled').first()
-            if existing_booking:
-                print(f"Slot already booked: {data['date']} {data['time']}")
-                return jsonify({'error': 'This time slot is already booked'}), 409
-        except Exception as e:
-            print(f"Warning: Could not check existing bookings due to column issue: {e}")
+            values = booking_values(data, user_email)
+        except ValueError as e:
+            bookings_log.info('invalid booking', extra={'error': str(e)})
+            return jsonify({'error': str(e)}), 400
+        booking_date = values['date']
         
-        if not column_exists('booking', 'user_email'):
-            print("user_email column does not exist, attempting to add it...")
-            migrate_database()
+        if not has_capability('booking.slot_unique'):
+            try:
+                if booked_slots({(booking_date, values['time'])}):
+                    bookings_log.info('slot already booked', extra={'date': data['date'], 'time': data['time']})
+                    return jsonify({'error': 'This time slot is already booked'}), 409
+            except Exception as e:
+                bookings_log.warning('slot check failed', extra={'error': str(e)})
         
-        if column_exists('booking', 'user_email'):
-            new_booking = Booking(
-                id=f"BK{str(uuid.uuid4())[:8].upper()}",
-                service=data['service'],
-                date=data['date'],
-                time=data['time'],
-                name=data['name'],
-                email=data['email'],
-                phone=data['phone'],
-                notes=data.get('notes', ''),
-                status='confirmed',
-                user_email=user_email
-            )
-        else:
-            new_booking = Booking(
-                id=f"BK{str(uuid.uuid4())[:8].upper()}",
-                service=data['service'],
-                date=data['date'],
-                time=data['time'],
-                name=data['name'],
-                email=data['email'],
-                phone=data['phone'],
-                notes=data.get('notes', ''),
-                status='confirmed'
-            )
-            print("Warning: Created booking without user_email column")
+        new_booking = Booking(**values)
+        if 'user_email' not in values:
+            bookings_log.warning('booking created without user_email column')
         
-        print(f"Creating booking: {new_booking.id}")
+        booking_dict = new_booking.to_dict()
         
         db.session.add(new_booking)
-        db.session.commit()
-        print(f"Booking saved to database: {new_booking.id}")
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            bookings_log.info('slot already booked', extra={'date': data['date'], 'time': data['time']})
+            return jsonify({'error': 'This time slot is already booked'}), 409
+        booking_changed('booking.created', user_email, [booking_dict], booked=[(booking_date, values['time'])])
+        bookings_log.info('booking created', extra={'booking_id': booking_dict['id'], 'user': user_ref(user_email)})
         
-        return jsonify(new_booking.to_dict()), 201
+        response = jsonify(booking_dict)
+        response.set_etag(str(booking_dict['version']))
+        return response, 201
     except Exception as e:
-        print(f"ERROR creating booking: {str(e)}")
+        bookings_log.exception('booking creation failed')
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/bookings/<booking_id>', methods=['PUT'])
+def insert_bookings_individually(rows):
+    """Insert rows one savepoint at a time; returns the ids that lost a slot race."""
+    conflicted = set()
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(Booking), [row])
+        except IntegrityError:
+            conflicted.add(row['id'])
+    return conflicted
+
+@bp.route('/api/bookings/batch', methods=['POST'])
+@idempotent
 @login_required
-def update_booking(booking_id):
+def create_bookings_batch():
+    """Create several bookings with one conflict query, one INSERT and one commit.
+
+    Body: {"mode": "all_or_nothing" | "best_effort", "bookings": [...]}.
+    Every item gets a result; in all_or_nothing mode nothing is written
+    unless every item can be created.
+    """
     try:
-        ensure_migration()
+        data = request.get_json() or {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+        items = data.get('bookings')
+        mode = data.get('mode', 'all_or_nothing')
+        if mode not in ('all_or_nothing', 'best_effort'):
+            return jsonify({'error': 'mode must be all_or_nothing or best_effort'}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'bookings must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_BOOKINGS:
+            return jsonify({'error': f'At most {MAX_BATCH_BOOKINGS} bookings per batch'}), 400
         
-        resp = google.get("/oauth2/v2/userinfo")
-        if not resp.ok:
-            return jsonify({'error': 'Failed to get user info'}), 401
+        user_email = g.user['email']
+        results = [None] * len(items)
+        candidates = {}
+        for index, item in enumerate(items):
+            try:
+                values = booking_values(item, user_email)
+            except ValueError as e:
+                results[index] = {'index': index, 'status': 'invalid', 'error': str(e)}
+                continue
+            slot = (values['date'], values['time'])
+            if slot in candidates:
+                results[index] = {'index': index, 'status': 'conflict', 'error': 'Duplicate time slot in batch'}
+                continue
+            candidates[slot] = (index, values)
         
-        user_info = resp.json()
-        user_email = user_info.get('email')
+        for slot in booked_slots(candidates.keys()):
+            index, _ = candidates.pop(slot)
+            results[index] = {'index': index, 'status': 'conflict', 'error': 'This time slot is already booked'}
         
-        data = request.get_json()
-        booking = db.session.get(Booking, booking_id)
-        if not booking:
-            return jsonify({'error': 'Booking not found'}), 404
+        failed = any(results)
+        if mode == 'all_or_nothing' and failed:
+            for index, _ in candidates.values():
+                results[index] = {'index': index, 'status': 'skipped'}
+            has_conflict = any(r['status'] == 'conflict' for r in results)
+            return jsonify({'mode': mode, 'created': 0, 'results': results}), 409 if has_conflict else 400
         
-        if column_exists('booking', 'user_email') and hasattr(booking, 'user_email'):
-            if booking.user_email and booking.user_email != user_email:
-                return jsonify({'error': 'Unauthorized: You can only modify your own bookings'}), 403
-            
-            if not booking.user_email and booking.email != user_email:
-                return jsonify({'error': 'Unauthorized: You can only modify your own bookings'}), 403
-        else:
-            if booking.email != user_email:
-                return jsonify({'error': 'Unauthorized: You can only modify your own bookings'}), 403
+        rows = [values for _, values in candidates.values()]
+        conflicted = set()
+        if rows:
+            try:
+                db.session.execute(insert(Booking), rows)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                if mode == 'all_or_nothing':
+                    for index, _ in candidates.values():
+                        results[index] = {'index': index, 'status': 'conflict', 'error': 'A time slot was booked concurrently'}
+                    return jsonify({'mode': mode, 'created': 0, 'results': results}), 409
+                conflicted = insert_bookings_individually(rows)
+                db.session.commit()
         
-        for key, value in data.items():
-            if hasattr(booking, key) and key != 'user_email':
-                setattr(booking, key, value)
-        db.session.commit()
-        if request.headers.get('HX-Request'):
-            return render_template('booking_card.html', booking=booking)
-        else:
-            booking_dict = booking.to_dict()
-            print(f"Returning booking dict: {booking_dict}")
-            return jsonify(booking_dict)
+        created = []
+        booked = []
+        for index, values in candidates.values():
+            if values['id'] in conflicted:
+                results[index] = {'index': index, 'status': 'conflict', 'error': 'This time slot is already booked'}
+            else:
+                created.append(Booking(**values).to_dict())
+                booked.append((values['date'], values['time']))
+                results[index] = {'index': index, 'status': 'created', 'booking': created[-1]}
+        if created:
+            booking_changed('booking.created', user_email, created, booked=booked)
+        bookings_log.info('booking batch created', extra={'created_count': len(created), 'requested_count': len(items), 'mode': mode})
+        
+        status_code = 201 if len(created) == len(items) else 207
+        return jsonify({'mode': mode, 'created': len(created), 'results': results}), status_code
     except Exception as e:
-        print(f"Error in update_booking: {str(e)}")
+        db.session.rollback()
+        bookings_log.exception('booking batch failed')
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/bookings/<booking_id>', methods=['DELETE'])
+UPDATABLE_BOOKING_FIELDS = ('service', 'date', 'time', 'name', 'email', 'phone', 'notes')
+
+class BookingWriteError(Exception):
+    def __init__(self, message, status_code, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+    def response(self):
+        return jsonify(dict(self.details, error=str(self))), self.status_code
+
+def booking_changes(data):
+    """Column changes for an edit, limited to UPDATABLE_BOOKING_FIELDS; raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError('Booking must be a JSON object')
+    readonly = sorted(set(data) - set(UPDATABLE_BOOKING_FIELDS) - {'version'})
+    if readonly:
+        raise ValueError(f"Cannot change: {', '.join(readonly)}")
+    changes = {field: data[field] for field in UPDATABLE_BOOKING_FIELDS if field in data}
+    for field, value in changes.items():
+        if field != 'notes' and not value:
+            raise ValueError(f'{field} cannot be empty')
+        if not isinstance(value, str) and not (field == 'notes' and value is None):
+            raise ValueError(f'{field} must be a string')
+    try:
+        if 'date' in changes:
+            changes['date'] = parse_booking_date(changes['date'])
+        if 'time' in changes:
+            changes['time'] = parse_booking_time(changes['time'])
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date or time')
+    return changes
+
+def expected_version(data):
+    """The version the client last saw, from the body or an If-Match header, or None.
+
+    Single-booking responses send the version as their ETag, so If-Match can
+    echo it back unchanged.
+    """
+    version = data.get('version') if isinstance(data, dict) else None
+    if version is None and request.if_match:
+        version = next(iter(request.if_match.as_set()), None)
+    if version is None:
+        return None
+    try:
+        return int(version)
+    except (TypeError, ValueError):
+        raise ValueError('version must be an integer')
+
+def booking_write_error(booking_id, user_email, action):
+    """Why a conditional update matched no row; only runs on the failure path."""
+    found = db.session.execute(
+        db.select(Booking.version, Booking.status, owned_by(user_email)).where(Booking.id == booking_id)
+    ).first()
+    if found is None:
+        return BookingWriteError('Booking not found', 404)
+    version, status, owned = found
+    if not owned:
+        return BookingWriteError(f'Unauthorized: You can only {action} your own bookings', 403)
+    if action == 'cancel' and status == 'cancelled':
+        return BookingWriteError('Booking is already cancelled', 409, version=version)
+    return BookingWriteError('Booking was changed by another request', 409, version=version)
+
+def update_owned_booking(booking_id, user_email, changes, version, action, conditions=()):
+    """Apply `changes` to the user's booking in one UPDATE ... WHERE id, owner, version RETURNING.
+
+    Returns (row, previous) where row matches booking_columns() and previous
+    is the (date, time, status) the booking had before. Raises
+    BookingWriteError when nothing matched.
+
+    On PostgreSQL the old row is locked and read in a CTE of the same
+    statement. SQLite writes RETURNING without table prefixes, so a
+    self-join would return the new values there. Other dialects lock and
+    read the row first, then update it (with RETURNING where supported).
+    """
+    conditions = [Booking.id == booking_id, owned_by(user_email), *conditions]
+    if version is not None:
+        conditions.append(Booking.version == version)
+    values = dict(changes, version=Booking.version + 1)
+
+    if db.engine.dialect.name == 'postgresql':
+        # FOR UPDATE re-reads the latest committed row after waiting for a concurrent
+        # writer, so `previous` is the row this UPDATE actually replaces.
+        previous = (db.select(Booking.id, Booking.date, Booking.time, Booking.status)
+                    .where(*conditions).with_for_update().cte('previous'))
+        row = db.session.execute(
+            update(Booking)
+            .where(Booking.id == previous.c.id)
+            .values(**values)
+            .returning(*booking_columns(), previous.c.date, previous.c.time, previous.c.status),
+            execution_options={'synchronize_session': False}
+        ).first()
+        if row is None:
+            raise booking_write_error(booking_id, user_email, action)
+        return tuple(row[:-3]), tuple(row[-3:])
+
+    previous = db.session.execute(
+        db.select(Booking.date, Booking.time, Booking.status).where(*conditions).with_for_update()
+    ).first()
+    if previous is None:
+        raise booking_write_error(booking_id, user_email, action)
+    statement = update(Booking).where(*conditions).values(**values)
+    if db.engine.dialect.update_returning:
+        row = db.session.execute(statement.returning(*booking_columns()),
+                                 execution_options={'synchronize_session': False}).first()
+    else:
+        db.session.execute(statement, execution_options={'synchronize_session': False})
+        row = db.session.execute(db.select(*booking_columns()).where(Booking.id == booking_id)).first()
+    return tuple(row), tuple(previous)
+
+def held_slots(date_value, time_value, status):
+    """[(date, time)] if a booking in this state holds its slot, else []."""
+    return [(date_value, time_value)] if status not in INACTIVE_STATUSES else []
+
+def booking_response(booking, status=200):
+    """A booking as JSON, or as its card for HTMX, with its version as the ETag."""
+    if request.headers.get('HX-Request'):
+        response = current_app.make_response(render_booking_card(booking))
+    else:
+        response = jsonify(booking)
+    response.status_code = status
+    response.set_etag(str(booking['version']))
+    return response
+
+@bp.route('/api/bookings/<booking_id>', methods=['PUT'])
+@idempotent
 @login_required
-def delete_booking(booking_id):
+def update_booking(booking_id):
     try:
-        ensure_migration()
+        user_email = g.user['email']
         
-        resp = google.get("/oauth2/v2/userinfo")
-        if not resp.ok:
-            return jsonify({'error': 'Failed to get user info'}), 401
-        
-        user_info = resp.json()
-        user_email = user_info.get('email')
+        data = request.get_json()
+        try:
+            changes = booking_changes(data)
+            version = expected_version(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        booking = db.session.get(Booking, booking_id)
-        if not booking:
-            return jsonify({'error': 'Booking not found'}), 404
+        try:
+            row, previous = update_owned_booking(booking_id, user_email, changes, version, 'modify')
+            db.session.commit()
+        except BookingWriteError as e:
+            db.session.rollback()
+            return e.response()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({'error': 'This time slot is already booked'}), 409
+        booking_dict = booking_row_dict(row)
+        # Only slots that changed hands: a notes-only edit keeps its slot.
+        now_held = held_slots(row[2], row[3], booking_dict['status'])
+        was_held = held_slots(*previous)
+        booking_changed('booking.updated', user_email, [booking_dict],
+                        booked=[slot for slot in now_held if slot not in was_held],
+                        released=[slot for slot in was_held if slot not in now_held])
+        return booking_response(booking_dict)
+    except Exception as e:
+        db.session.rollback()
+        bookings_log.exception('booking update failed', extra={'booking_id': booking_id})
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/bookings/<booking_id>', methods=['DELETE'])
+@idempotent
+@login_required
+def delete_booking(booking_id):
+    try:
+        user_email = g.user['email']
         
-        if column_exists('booking', 'user_email') and hasattr(booking, 'user_email'):
-            if booking.user_email and booking.user_email != user_email:
-                return jsonify({'error': 'Unauthorized: You can only cancel your own bookings'}), 403
-            
-            if not booking.user_email and booking.email != user_email:
-                return jsonify({'error': 'Unauthorized: You can only cancel your own bookings'}), 403
-        else:
-            if booking.email != user_email:
-                return jsonify({'error': 'Unauthorized: You can only cancel your own bookings'}), 403
+        try:
+            version = expected_version(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        booking.status = 'cancelled'
-        db.session.commit()
-        if request.headers.get('HX-Request'):
-            return render_template('booking_card.html', booking=booking)
-        else:
-            booking_dict = booking.to_dict()
-            print(f"Returning booking dict: {booking_dict}")
-            return jsonify(booking_dict)
+        try:
+            row, previous = update_owned_booking(booking_id, user_email, {'status': 'cancelled'}, version, 'cancel',
+                                                 conditions=[Booking.status != 'cancelled'])
+            db.session.commit()
+        except BookingWriteError as e:
+            db.session.rollback()
+            return e.response()
+        booking_dict = booking_row_dict(row)
+        booking_changed('booking.cancelled', user_email, [booking_dict], released=held_slots(*previous))
+        return booking_response(booking_dict)
     except Exception as e:
-        print(f"Error in delete_booking: {str(e)}")
+        db.session.rollback()
+        bookings_log.exception('booking cancellation failed', extra={'booking_id': booking_id})
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/slots/<date>', methods=['GET'])
+@bp.route('/api/slots/<date>', methods=['GET'])
 @login_required
+@read_only
+@etag_cached(lambda date: [f'date:{parse_booking_date(date).isoformat()}'])
 def get_available_slots(date):
     try:
-        slots = []
-        start_hour = 8
-        end_hour = 20
-        for hour in range(start_hour, end_hour):
-            slots.append(f"{hour:02d}:00")
-            if hour < end_hour - 1:
-                slots.append(f"{hour:02d}:30")
-        
-        booked_slots = [
-            booking.time
-            for booking in Booking.query.filter_by(date=date).filter(Booking.status != 'cancelled').all()
-        ]
-        available_slots = [slot for slot in slots if slot not in booked_slots]
-        return jsonify(available_slots)
+        slot_date = parse_booking_date(date)
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    try:
+        slots = available_slots([slot_date], request.args.get('service'))
+        return jsonify(slots[slot_date.isoformat()])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def requested_range():
+    """Dates from the from/to query args; raises ValueError for a bad range."""
+    try:
+        start = parse_booking_date(request.args.get('from', ''))
+        end = parse_booking_date(request.args.get('to', request.args.get('from', '')))
+    except ValueError:
+        raise ValueError('from and to must be YYYY-MM-DD dates')
+    if end < start:
+        raise ValueError('to must not be before from')
+    if (end - start).days >= MAX_SLOT_RANGE_DAYS:
+        raise ValueError(f'Range is limited to {MAX_SLOT_RANGE_DAYS} days')
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+@bp.route('/api/slots', methods=['GET'])
+@login_required
+@read_only
+@etag_cached(lambda: [f'date:{day}' for day in requested_range()])
+def get_available_slots_range():
+    try:
+        dates = requested_range()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(available_slots(dates, request.args.get('service')))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/services', methods=['GET'])
+@bp.route('/api/services', methods=['GET'])
 @login_required
 def get_services():
-    services = [
-        {
-            'id': 'room',
-            'name': 'Hotel Room',
-            'description': 'Comfortable accommodation',
-            'price': '$150/night',
-            'icon': 'fas fa-bed'
-        },
-        {
-            'id': 'meeting',
-            'name': 'Meeting Room',
-            'description': 'Professional meeting space',
-            'price': '$75/hour',
-            'icon': 'fas fa-users'
-        },
-        {
-            'id': 'spa',
-            'name': 'Spa Treatment',
-            'description': 'Relaxing wellness services',
-            'price': '$120/session',
-            'icon': 'fas fa-spa'
-        }
-    ]
-    return jsonify(services)
+    response = jsonify(SERVICES)
+    response.set_etag(SERVICES_ETAG)
+    response.headers['Cache-Control'] = f'private, max-age={SERVICES_MAX_AGE}'
+    return response.make_conditional(request)
 
-@app.route('/htmx/bookings-list', methods=['GET'])
+@bp.route('/htmx/bookings-list', methods=['GET'])
 @login_required
+@read_only
+@etag_cached(lambda: [f"user:{g.user['email']}"])
 def htmx_bookings_list():
-    ensure_migration()
-    
-    resp = google.get("/oauth2/v2/userinfo")
-    if not resp.ok:
-        return jsonify({'error': 'Failed to get user info'}), 401
-    
-    user_info = resp.json()
-    user_email = user_info.get('email')
-    
     try:
-        if column_exists('booking', 'user_email'):
-            bookings = Booking.query.filter(
-                (Booking.user_email == user_email) | 
-                ((Booking.user_email.is_(None)) & (Booking.email == user_email)),
-                Booking.status != 'cancelled'
-            ).all()
-        else:
-            bookings = Booking.query.filter(
-                Booking.email == user_email,
-                Booking.status != 'cancelled'
-            ).all()
-    except Exception as e:
-        print(f"Warning: Error in user-specific booking query, falling back to email-only: {e}")
-        bookings = Booking.query.filter(
-            Booking.email == user_email,
-            Booking.status != 'cancelled'
-        ).all()
+        filters = listing_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return render_template('bookings_list.html', bookings=bookings)
+    user_email = g.user['email']
+    # Same inputs as the ETag: the user's list version, their last write and the full query.
+    key = (f"list:{user_email}:{current_version(f'user:{user_email}')}:"
+           f"{session.get('last_write_at', 0)}:{request.full_path}")
+    html = fragment_get(key)
+    if html is None:
+        bookings, next_cursor = bookings_page(user_email, filters)
+        next_url = None
+        if next_cursor:
+            next_url = url_for('.htmx_bookings_list', **dict(request.args, cursor=next_cursor))
+        cards = [render_booking_card(booking_row_dict(b)) for b in bookings]
+        html = render_template('bookings_list.html', cards=cards, next_url=next_url)
+        fragment_put(key, html, user_email)
+    return html
 
-@app.route('/htmx/booking-form', methods=['GET'])
+@bp.route('/htmx/booking-form', methods=['GET'])
 @login_required
 def htmx_booking_form():
     return render_template('booking_form.html')
 
-@app.route('/api/migrate', methods=['POST'])
+@bp.route('/api/events', methods=['GET'])
+@login_required
+def booking_events():
+    """Server-Sent Events stream of booking deltas for the user and slot deltas for everyone.
+
+    A client that falls EVENT_STREAM_QUEUE_SIZE events behind gets a
+    'resync' event and the stream closes; it should refetch and reconnect.
+    """
+    stream = EventStream(g.user['email'])
+    # The generator outlives the request context, so hold on to this app's set.
+    streams = event_streams._get_current_object()
+    with event_streams_lock:
+        streams.add(stream)
+
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                if stream.overflowed:
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                try:
+                    name, data = stream.queue.get(timeout=EVENT_STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: {name}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            with event_streams_lock:
+                streams.discard(stream)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+asset_manifest = app_state('asset_manifest')
+
+def write_file_atomic(path, data):
+    tmp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+def build_assets():
+    """Copy ASSET_FILES to content-hashed names in static/dist, next to .gz and .br copies.
+
+    Brotli copies are only written when the brotli package is installed. Older
+    hashed files are kept for pages rendered before a deploy. Returns the
+    manifest that maps each source name to its hashed name.
+    """
+    ASSETS_DIR.mkdir(exist_ok=True)
+    manifest = {}
+    for name in ASSET_FILES:
+        source = (STATIC_DIR / name).read_bytes()
+        stem, suffix = os.path.splitext(name)
+        hashed = f'{stem}.{hashlib.sha256(source).hexdigest()[:12]}{suffix}'
+        variants = {hashed + '.gz': lambda: gzip.compress(source, 9, mtime=0)}
+        if brotli is not None:
+            variants[hashed + '.br'] = lambda: brotli.compress(source)
+        for variant, compress in variants.items():
+            if not (ASSETS_DIR / variant).exists():
+                write_file_atomic(ASSETS_DIR / variant, compress())
+        if not (ASSETS_DIR / hashed).exists():
+            write_file_atomic(ASSETS_DIR / hashed, source)
+        manifest[name] = hashed
+    write_file_atomic(ASSETS_DIR / 'manifest.json', json.dumps(manifest, indent=2).encode())
+    return manifest
+
+def load_assets():
+    """Build the asset manifest, or read the last one if static/ is read-only."""
+    try:
+        manifest = build_assets()
+    except OSError as e:
+        try:
+            manifest = json.loads((ASSETS_DIR / 'manifest.json').read_text())
+        except (OSError, ValueError):
+            manifest = {}
+        log.warning('could not build static assets', extra={'error': str(e), 'manifest_entries': len(manifest)})
+    asset_manifest.clear()
+    asset_manifest.update(manifest)
+
+@bp.app_template_global()
+def asset_url(name):
+    """URL of a fingerprinted asset, falling back to the plain static file."""
+    if name in asset_manifest:
+        return url_for('booking.asset', filename=asset_manifest[name])
+    return url_for('static', filename=name)
+
+def immutable(response):
+    response.headers['Cache-Control'] = f'public, max-age={ASSET_MAX_AGE}, immutable'
+    return response
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted assets, precompressed when the client accepts it.
+
+    Hashed names never change content, so browsers keep them for a year
+    without revalidating. A reverse proxy may serve static/dist directly
+    with the same headers, except for manifest.json, which changes on every
+    build and is not served here.
+    """
+    if filename == 'manifest.json':
+        abort(404)
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] > 0:
+            path = safe_join(str(ASSETS_DIR), filename + suffix)
+            if path and os.path.isfile(path):
+                response = send_from_directory(ASSETS_DIR, filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = encoding
+                break
+    else:
+        response = send_from_directory(ASSETS_DIR, filename)
+    response.headers['Vary'] = 'Accept-Encoding'
+    return immutable(response)
+
+@bp.route('/avatars/<filename>')
+def avatar(filename):
+    # cache_google_avatar versions these URLs, so a new picture gets a new URL.
+    response = send_from_directory(AVATARS_DIR, filename)
+    return immutable(response) if request.args.get('v') else response
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress static assets into static/dist."""
+    for name, hashed in build_assets().items():
+        click.echo(f'{name} -> dist/{hashed}')
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_filters(args):
+    """Validated export filters from query args or CLI options; raises ValueError on bad input."""
+    filters = {}
+    if args.get('from'):
+        filters['from'] = parse_booking_date(args['from'])
+    if args.get('to'):
+        filters['to'] = parse_booking_date(args['to'])
+    if 'from' in filters and 'to' in filters and filters['from'] > filters['to']:
+        raise ValueError("'from' must not be after 'to'")
+    if args.get('service'):
+        filters['service'] = args['service']
+    if args.get('status'):
+        filters['status'] = args['status']
+    if args.get('cursor'):
+        filters['cursor'] = decode_cursor(args['cursor'])
+    return filters
+
+def export_batches(filters):
+    """All matching bookings in (date, time, id) order, EXPORT_BATCH_SIZE rows at a time.
+
+    Rows come through a server-side cursor (yield_per implies stream_results),
+    so memory stays flat however many bookings match.
+    """
+    query = db.select(*booking_columns())
+    if 'status' in filters:
+        query = query.filter(Booking.status == filters['status'])
+    if 'service' in filters:
+        query = query.filter(Booking.service == filters['service'])
+    if 'from' in filters:
+        query = query.filter(Booking.date >= filters['from'])
+    if 'to' in filters:
+        query = query.filter(Booking.date <= filters['to'])
+    if 'cursor' in filters:
+        query = query.filter(tuple_(Booking.date, Booking.time, Booking.id) > tuple_(*filters['cursor']))
+    query = query.order_by(Booking.date, Booking.time, Booking.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    result = db.session.execute(query)
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+def encode_csv_rows(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+def encode_csv_batch(batch):
+    return encode_csv_rows(
+        (*row[:2], row.date.isoformat(), row.time.strftime('%H:%M'), *row[4:], encode_cursor(row))
+        for row in batch
+    )
+
+def encode_ndjson_batch(batch):
+    return b''.join(dumps_json(dict(booking_row_dict(row), cursor=encode_cursor(row))) + b'\n' for row in batch)
+
+def export_chunks(filters, export_format):
+    """(chunk, cursor) pairs; passing cursor back resumes the export after that chunk.
+
+    Every row also carries its own cursor (the last CSV column, or the
+    "cursor" field in NDJSON), so a client can resume after the last row it
+    received. CSV starts with a header row unless the export is being resumed.
+    """
+    if export_format == 'csv':
+        if 'cursor' not in filters:
+            yield encode_csv_rows([BOOKING_FIELDS + ('cursor',)]), None
+        encode_batch = encode_csv_batch
+    else:
+        encode_batch = encode_ndjson_batch
+    for batch in export_batches(filters):
+        yield encode_batch(batch), encode_cursor(batch[-1])
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+@bp.route('/api/admin/bookings/export', methods=['GET'])
+@admin_required
+@read_only
+def export_bookings():
+    """Stream every booking matching from/to/service/status as CSV or NDJSON.
+
+    Each row carries a cursor; pass the one from the last row received as
+    ?cursor= to resume the export after it.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        filters = export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    chunks = (chunk for chunk, _ in export_chunks(filters, export_format))
+    compress = request.args.get('gzip') == '1' or request.accept_encodings['gzip'] > 0
+    if compress:
+        chunks = gzip_chunks(chunks)
+    response = current_app.response_class(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="bookings.{export_format}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@bp.cli.command('export-bookings')
+@click.option('--from', 'from_date', help='First booking date (YYYY-MM-DD).')
+@click.option('--to', 'to_date', help='Last booking date (YYYY-MM-DD).')
+@click.option('--service', help='Only export this service.')
+@click.option('--status', help='Only export bookings with this status.')
+@click.option('--format', 'export_format', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write to this file instead of stdout.')
+@click.option('--cursor', help='Resume after this cursor, appending to --output.')
+def export_bookings_command(from_date, to_date, service, status, export_format, compress, output, cursor):
+    """Export bookings as CSV or NDJSON with constant memory.
+
+    The resume cursor is printed to stderr if the export stops early;
+    with --gzip the resumed part is appended as a new gzip member, which
+    gzip readers treat as one stream.
+    """
+    try:
+        filters = export_filters({'from': from_date, 'to': to_date, 'service': service,
+                                  'status': status, 'cursor': cursor})
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    out = open(output, 'ab' if cursor else 'wb') if output else sys.stdout.buffer
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    rows_cursor = cursor
+    try:
+        for chunk, chunk_cursor in export_chunks(filters, export_format):
+            out.write(compressor.compress(chunk) if compressor else chunk)
+            if compressor:
+                out.write(compressor.flush(zlib.Z_SYNC_FLUSH))
+            out.flush()
+            rows_cursor = chunk_cursor or rows_cursor
+        if compressor:
+            out.write(compressor.flush())
+    except BaseException:
+        if compressor:
+            # Close the gzip member so a resumed export can be appended after it.
+            out.write(compressor.flush())
+        if rows_cursor:
+            click.echo(f'Export interrupted; resume with --cursor {rows_cursor}', err=True)
+        raise
+    finally:
+        if output:
+            out.close()
+
+@bp.route('/api/migrate', methods=['GET', 'POST'])
 def manual_migrate():
+    """Report the schema version; migrations only run from `flask db upgrade`."""
     try:
-        print("Manual migration requested...")
-        success = ensure_migration()
-        if success:
-            return jsonify({'message': 'Migration completed successfully'}), 200
-        else:
-            return jsonify({'error': 'Migration failed'}), 500
+        load_schema_state({row.version for row in db.session.query(SchemaVersion.version)})
+        pending = [m['version'] for m in MIGRATIONS if m['version'] > schema_state['version']]
+        return jsonify({
+            'message': 'Run `flask --app server db upgrade` to apply pending migrations' if pending
+                       else 'Schema is up to date',
+            'pending': pending,
+            'schema_version': schema_state['version']
+        }), 200
     except Exception as e:
-        print(f"Error in manual migration: {e}")
+        db_log.exception('schema version lookup failed')
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/status', methods=['GET'])
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/api/status', methods=['GET'])
+@read_only
 def check_status():
     try:
-        user_email_exists = column_exists('booking', 'user_email')
+        user_email_exists = has_capability('booking.user_email')
+        latest_version = MIGRATIONS[-1]['version'] if MIGRATIONS else 0
         return jsonify({
             'user_email_column_exists': user_email_exists,
-            'migration_status': 'complete' if user_email_exists else 'pending'
+            'migration_status': 'complete' if schema_state['version'] >= latest_version else 'pending',
+            'schema_version': schema_state['version'],
+            'capabilities': sorted(schema_state['capabilities']),
+            'identity_cache': dict(identity_stats),
+            'availability_cache': dict(availability_stats, size=len(availability_cache)),
+            'avatar_cache': dict(avatar_stats, files=len(avatar_index), bytes=avatar_state['bytes']),
+            'idempotency': dict(idempotency_stats),
+            'fragment_cache': dict(fragment_stats, size=len(fragment_cache), shared=fragment_state['shared'] is not None),
+            'db_pool': pool_metrics(),
+            'event_streams': len(event_streams),
+            'logging': dict(log_stats, queued=log_state['listener'].queue.qsize() if log_state['listener'] else 0)
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def default_config():
+    """App config from the environment; create_app(config) overrides any of it."""
+    config = {
+        'SQLALCHEMY_DATABASE_URI': os.getenv('DATABASE_URL') or f"{SQL_TYPE}://{SQL_USER}:{SQL_PASSWORD}@{SQL_HOST}:{SQL_PORT}/{SQL_DB}",
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': os.getenv('FLASK_SECRET_KEY', 'dev-secret-key'),
+        'EVENT_BACKEND': EVENT_BACKEND
+    }
+    if SQL_REPLICA_HOST:
+        config['SQLALCHEMY_BINDS'] = {
+            'replica': f"{SQL_TYPE}://{SQL_USER}:{SQL_PASSWORD}@{SQL_REPLICA_HOST}:{SQL_REPLICA_PORT}/{SQL_DB}"
+        }
+    return config
+
+def create_app(config=None):
+    """Build the app without touching the database.
+
+    Engines connect on first use and schema state is read on the first
+    request; run `flask --app server db upgrade` once per deploy to apply
+    migrations.
+    """
+    app = Flask(__name__)
+    app.config.update(default_config())
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    configure_logging()
+    db.init_app(app)
+    app.register_blueprint(google_bp, url_prefix="/login")
+    app.register_blueprint(bp)
+    app.cli.add_command(db_cli)
+    app.extensions['booking_state'] = new_app_state()
+
+    events = make_event_backend(app)
+    events.subscribe(apply_booking_event)
+    events.subscribe(fan_out_booking_event)
+    app.extensions['booking_events'] = events
+
+    AVATARS_DIR.mkdir(exist_ok=True)
+    if not avatar_index:
+        load_avatar_index()
+    with app.app_context():
+        load_assets()
+        if app.config.get('FRAGMENT_CACHE_URL', FRAGMENT_CACHE_URL):
+            try:
+                fragment_state['shared'] = RedisFragmentStore(app.config.get('FRAGMENT_CACHE_URL', FRAGMENT_CACHE_URL))
+            except ImportError:
+                log.warning('FRAGMENT_CACHE_URL is set but redis is not installed; using the local cache only')
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        upgrade_database()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -5,6 +5,7 @@ function bookingApp() {
         selectedDate: '',
         selectedTime: '',
         availableSlots: [],
+        availability: {},
         showSuccessModal: false,
         lastBookingId: '',
         lastBookingService: '',
@@ -12,6 +13,7 @@ function bookingApp() {
         lastBookingTime: '',
         isEditMode: false,
         editingBookingId: null,
+        editingBookingVersion: null,
         showCancelModal: false,
         cancelBookingId: null,
         
@@ -25,6 +27,9 @@ function bookingApp() {
         bookings: [
             
         ],
+        nextBookingsCursor: null,
+        eventsConnected: false,
+        mutationKeys: {},
         
         get today() {
             return new Date().toISOString().split('T')[0];
@@ -34,10 +39,70 @@ function bookingApp() {
             this.loadUserInfo();
             this.updateAvailableSlots();
             this.fetchBookings();
+            this.connectEvents();
             
             this.checkForLoginSuccess();
         },
         
+        connectEvents() {
+            if (!window.EventSource) return;
+            
+            const source = new EventSource('/api/events');
+            source.onopen = () => { this.eventsConnected = true; };
+            source.onerror = () => { this.eventsConnected = false; };
+            
+            ['booking.created', 'booking.updated', 'booking.cancelled'].forEach(type => {
+                source.addEventListener(type, event => this.applyBookingEvent(type, JSON.parse(event.data)));
+            });
+            source.addEventListener('slots.changed', event => this.applySlotsEvent(JSON.parse(event.data)));
+            source.addEventListener('resync', () => {
+                this.availability = {};
+                this.fetchBookings();
+                this.updateAvailableSlots();
+            });
+        },
+        
+        applyBookingEvent(type, booking) {
+            if (type === 'booking.cancelled') {
+                this.bookings = this.bookings.filter(b => b.id !== booking.id);
+                return;
+            }
+            
+            const bookingIndex = this.bookings.findIndex(b => b.id === booking.id);
+            if (bookingIndex !== -1) {
+                this.bookings[bookingIndex] = { ...this.bookings[bookingIndex], ...booking };
+            } else {
+                this.bookings.push({ ...booking, highlight: false });
+            }
+            this.bookings.sort((a, b) => `${a.date} ${a.time} ${a.id}`.localeCompare(`${b.date} ${b.time} ${b.id}`));
+        },
+        
+        applySlotsEvent(slots) {
+            for (const key of Object.keys(this.availability)) {
+                const date = key.split('|')[1];
+                let daySlots = this.availability[key];
+                for (const [slotDate, time] of slots.booked) {
+                    if (slotDate === date) daySlots = daySlots.filter(slot => slot !== time);
+                }
+                for (const [slotDate, time] of slots.released) {
+                    if (slotDate === date && !daySlots.includes(time)) daySlots = [...daySlots, time].sort();
+                }
+                this.availability[key] = daySlots;
+            }
+            
+            if (this.selectedDate && this.availability[this.availabilityKey(this.selectedDate)]) {
+                this.availableSlots = this.availability[this.availabilityKey(this.selectedDate)];
+            }
+        },
+        
+        refreshAfterMutation() {
+            // With the event stream connected, deltas arrive on their own.
+            if (!this.eventsConnected) {
+                this.availability = {};
+                this.fetchBookings();
+            }
+        },
+        
         checkForLoginSuccess() {
             const urlParams = new URLSearchParams(window.location.search);
             if (urlParams.has('login_success') || window.location.pathname.includes('authorized')) {
@@ -120,12 +185,15 @@ function bookingApp() {
             }
         },
         
-        async fetchBookings() {
+        async fetchBookings(cursor = null) {
             try {
-                const response = await fetch('/api/bookings');
+                const url = cursor ? `/api/bookings?cursor=${encodeURIComponent(cursor)}` : '/api/bookings';
+                const response = await fetch(url);
                 if (response.ok) {
-                    const bookings = await response.json();
-                    this.bookings = bookings.map(b => ({ ...b, highlight: false }));
+                    const page = await response.json();
+                    const bookings = page.bookings.map(b => ({ ...b, highlight: false }));
+                    this.bookings = cursor ? this.bookings.concat(bookings) : bookings;
+                    this.nextBookingsCursor = page.next_cursor;
                 } else {
                     console.error('Failed to fetch bookings');
                 }
@@ -134,12 +202,54 @@ function bookingApp() {
             }
         },
         
-        updateAvailableSlots() {
+        async updateAvailableSlots() {
             if (!this.selectedDate) {
                 this.availableSlots = [];
                 return;
             }
 
+            const date = this.selectedDate;
+            const key = this.availabilityKey(date);
+            if (!this.availability[key]) {
+                await this.fetchAvailability(date);
+            }
+
+            if (this.selectedDate === date) {
+                this.availableSlots = this.availability[key] || this.defaultSlots();
+            }
+        },
+
+        availabilityKey(date) {
+            return `${this.selectedService || ''}|${date}`;
+        },
+
+        async fetchAvailability(fromDate) {
+            const toDate = new Date(fromDate);
+            toDate.setDate(toDate.getDate() + 6);
+            const params = new URLSearchParams({
+                from: fromDate,
+                to: toDate.toISOString().split('T')[0]
+            });
+            if (this.selectedService) {
+                params.set('service', this.selectedService);
+            }
+
+            try {
+                const response = await fetch(`/api/slots?${params}`);
+                if (response.ok) {
+                    const slotsByDate = await response.json();
+                    for (const [date, slots] of Object.entries(slotsByDate)) {
+                        this.availability[this.availabilityKey(date)] = slots;
+                    }
+                } else {
+                    console.error('Failed to fetch available slots');
+                }
+            } catch (error) {
+                console.error('Error fetching available slots:', error);
+            }
+        },
+
+        defaultSlots() {
             const slots = [];
             const startHour = 8;
             const endHour = 20;
@@ -154,7 +264,7 @@ function bookingApp() {
                 }
             }
 
-            this.availableSlots = slots;
+            return slots;
         },
         
         getServiceName(service) {
@@ -195,10 +305,10 @@ function bookingApp() {
                    this.bookingForm.phone;
         },
         
-        submitBooking() {
+        submitBooking(savedBooking = null) {
             if (!this.canSubmit()) return;
             
-            const newBooking = {
+            const newBooking = savedBooking || {
                 id: this.generateBookingId(),
                 service: this.selectedService,
                 date: this.selectedDate,
@@ -210,7 +320,11 @@ function bookingApp() {
                 status: 'confirmed'
             };
             
-            this.bookings.unshift(newBooking);
+            if (savedBooking) {
+                this.applyBookingEvent('booking.created', savedBooking);
+            } else {
+                this.bookings.unshift(newBooking);
+            }
             
             this.lastBookingId = newBooking.id;
             this.lastBookingService = newBooking.service;
@@ -256,11 +370,13 @@ function bookingApp() {
         exitEditMode() {
             this.isEditMode = false;
             this.editingBookingId = null;
+            this.editingBookingVersion = null;
         },
         
         editBooking(booking) {
             this.isEditMode = true;
             this.editingBookingId = booking.id;
+            this.editingBookingVersion = booking.version ?? null;
             
             this.selectedService = booking.service;
             this.selectedDate = booking.date;
@@ -292,19 +408,35 @@ function bookingApp() {
             this.cancelBookingId = bookingId;
             this.showCancelModal = true;
         },
+        // Retrying a mutation that never got a response reuses its Idempotency-Key,
+        // so the server replays the first result instead of applying it twice.
+        async sendMutation(method, url, body = null) {
+            const fingerprint = `${method} ${url} ${body || ''}`;
+            if (!this.mutationKeys[fingerprint]) {
+                this.mutationKeys[fingerprint] = window.crypto && crypto.randomUUID
+                    ? crypto.randomUUID()
+                    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            }
+            const response = await fetch(url, {
+                method,
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': this.mutationKeys[fingerprint]
+                },
+                body
+            });
+            delete this.mutationKeys[fingerprint];
+            return response;
+        },
+        
         async confirmCancelBooking() {
             if (this.cancelBookingId) {
                 try {
-                    const response = await fetch(`/api/bookings/${this.cancelBookingId}`, {
-                        method: 'DELETE',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        }
-                    });
+                    const response = await this.sendMutation('DELETE', `/api/bookings/${this.cancelBookingId}`);
                     if (response.ok) {
                         this.bookings = this.bookings.map(b => b.id === this.cancelBookingId ? { ...b, status: 'cancelled' } : b);
                         showNotification('Booking cancelled successfully!', 'success');
-                        this.fetchBookings();
+                        this.refreshAfterMutation();
                     } else {
                         showNotification('Failed to cancel booking.', 'error');
                     }
@@ -328,21 +460,10 @@ function bookingApp() {
                 let response;
                 
                 if (this.isEditMode) {
-                    response = await fetch(`/api/bookings/${this.editingBookingId}`, {
-                        method: 'PUT',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify(formData)
-                    });
+                    const edit = { ...formData, version: this.editingBookingVersion ?? undefined };
+                    response = await this.sendMutation('PUT', `/api/bookings/${this.editingBookingId}`, JSON.stringify(edit));
                 } else {
-                    response = await fetch('/api/bookings', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify(formData)
-                    });
+                    response = await this.sendMutation('POST', '/api/bookings', JSON.stringify(formData));
                 }
                 
                 if (response.ok) {
@@ -354,16 +475,19 @@ function bookingApp() {
                             this.bookings[bookingIndex].highlight = true;
                             setTimeout(() => {
                                 this.bookings[bookingIndex].highlight = false;
-                                this.fetchBookings();
                             }, 3000);
                         }
                         this.exitEditMode();
                         showNotification('Booking updated successfully!', 'success');
                         this.activeTab = 'my-bookings';
                     } else {
-                        this.submitBooking();
+                        this.submitBooking(await response.json());
                     }
-                    this.fetchBookings();
+                    this.refreshAfterMutation();
+                } else if (this.isEditMode && response.status === 409) {
+                    const conflict = await response.json();
+                    showNotification(conflict.error, 'error');
+                    this.refreshAfterMutation();
                 } else {
                     console.error('Booking failed');
                 }
@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Make `import server` work under a bare `pytest` as well as `python -m pytest`.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server
+
+
+class FakeResponse:
+    ok = True
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeGoogle:
+    """Stands in for the flask-dance proxy: always signed in as one user."""
+    authorized = True
+    token = {'access_token': 'test-token'}
+
+    def get(self, url):
+        return FakeResponse({'email': 'owner@example.com', 'name': 'Owner', 'picture': None})
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """create_app() on a SQLite file under tmp_path, signed in as FakeGoogle's user."""
+    monkeypatch.setattr(server, 'google', FakeGoogle())
+    # Keep built assets and cached avatars out of the working tree.
+    monkeypatch.setattr(server, 'ASSETS_DIR', tmp_path / 'dist')
+    monkeypatch.setattr(server, 'AVATARS_DIR', tmp_path / 'avatars')
+
+    def make_app(database='test.db'):
+        return server.create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/{database}', 'TESTING': True})
+    return make_app
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        server.upgrade_database()
+    return app
+
+
+@pytest.fixture
+def events(app):
+    published = []
+    app.extensions['booking_events'].subscribe(published.append)
+    return published
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,16 @@
+import server
+
+
+def test_apps_do_not_share_caches(app, client, make_app):
+    client.post('/api/bookings', json={
+        'service': 'spa', 'date': '2030-01-01', 'time': '10:00',
+        'name': 'Owner', 'email': 'owner@example.com', 'phone': '555'
+    })
+    assert '10:00' not in client.get('/api/slots/2030-01-01').get_json()
+
+    other = make_app('other.db')
+    with other.app_context():
+        server.upgrade_database()
+
+    assert '10:00' in other.test_client().get('/api/slots/2030-01-01').get_json()
+    assert '10:00' not in client.get('/api/slots/2030-01-01').get_json()
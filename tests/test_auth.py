@@ -0,0 +1,19 @@
+from flask import session
+from flask_dance.consumer import oauth_authorized
+
+import server
+
+
+def test_login_resolves_identity_from_the_oauth_signal(app):
+    with app.test_request_context('/login/google/authorized'):
+        results = oauth_authorized.send(server.google_bp, token={'access_token': 'test-token'})
+        response = next(ret for _, ret in results if ret is not None)
+
+        assert response.status_code == 302
+        assert 'login_success=true' in response.location
+        assert session['identity']['user']['email'] == 'owner@example.com'
+
+
+def test_dance_owns_the_authorized_url(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.rule == '/login/google/authorized'}
+    assert endpoints == {'google.authorized'}
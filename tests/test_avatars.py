@@ -0,0 +1,43 @@
+import time
+from concurrent.futures import Future
+
+import server
+
+
+class FakeAvatarResponse:
+    status_code = 200
+    content = b'jpeg-bytes'
+    headers = {'ETag': '"a1"'}
+
+
+def wait_for_fetches():
+    deadline = time.monotonic() + 5
+    while server.avatar_inflight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not server.avatar_inflight
+
+
+def test_avatar_is_fetched_in_the_background_and_served_immutable(app, client, monkeypatch):
+    monkeypatch.setattr(server.http_session, 'get', lambda url, **kwargs: FakeAvatarResponse())
+    with app.app_context():
+        assert server.cache_google_avatar('https://example.com/a.jpg', 'owner@example.com') is None
+        wait_for_fetches()
+        url = server.cache_google_avatar('https://example.com/a.jpg', 'owner@example.com')
+
+    response = client.get(url)
+    assert response.get_data() == b'jpeg-bytes'
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_scheduling_does_not_deadlock_when_the_fetch_finishes_first(app, monkeypatch):
+    def submit_inline(fn, *args):
+        future = Future()
+        future.set_result(None)
+        return future
+
+    monkeypatch.setattr(server.avatar_executor, 'submit', submit_inline)
+    with app.app_context():
+        server.cache_google_avatar('https://example.com/b.jpg', 'other@example.com')
+    assert server.avatar_lock.acquire(timeout=1)
+    server.avatar_lock.release()
+    server.avatar_inflight.clear()
@@ -0,0 +1,59 @@
+import pytest
+
+from test_bookings import book
+
+
+def item(time, **overrides):
+    return dict({'service': 'spa', 'date': '2030-04-01', 'time': time,
+                 'name': 'Owner', 'email': 'owner@example.com', 'phone': '555'}, **overrides)
+
+
+@pytest.mark.parametrize('bad', [
+    {'date': 20300401},
+    {'name': ['Owner']},
+    {'notes': {'text': 'hi'}},
+    {'phone': 555},
+])
+def test_badly_typed_items_are_reported_as_invalid(client, bad):
+    response = client.post('/api/bookings/batch', json={
+        'mode': 'best_effort', 'bookings': [item('09:00'), item('09:30', **bad)]
+    })
+
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['created', 'invalid']
+    assert 'INSERT' not in results[1]['error']
+
+
+def test_badly_typed_single_booking_is_a_400(client):
+    response = client.post('/api/bookings', json=item('09:00', date=20300401))
+    assert response.status_code == 400
+    assert client.post('/api/bookings', json=[item('09:00')]).status_code == 400
+
+
+def test_batch_body_must_be_an_object(client):
+    response = client.post('/api/bookings/batch', json=[item('09:00')])
+    assert response.status_code == 400
+
+
+def test_all_or_nothing_writes_nothing_on_conflict(client):
+    book(client, '2030-04-01', '10:00')
+
+    response = client.post('/api/bookings/batch', json={'bookings': [item('09:00'), item('10:00')]})
+
+    assert response.status_code == 409
+    assert [r['status'] for r in response.get_json()['results']] == ['skipped', 'conflict']
+    assert '09:00' in client.get('/api/slots/2030-04-01').get_json()
+
+
+def test_best_effort_creates_what_it_can(client):
+    book(client, '2030-04-01', '10:00')
+
+    response = client.post('/api/bookings/batch', json={
+        'mode': 'best_effort', 'bookings': [item('09:00'), item('10:00'), item('09:00'), item('11:00')]
+    })
+
+    assert response.status_code == 207
+    body = response.get_json()
+    assert body['created'] == 2
+    assert [r['status'] for r in body['results']] == ['created', 'conflict', 'conflict', 'created']
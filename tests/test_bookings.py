@@ -0,0 +1,73 @@
+def book(client, date, time):
+    response = client.post('/api/bookings', json={
+        'service': 'spa', 'date': date, 'time': time,
+        'name': 'Owner', 'email': 'owner@example.com', 'phone': '555'
+    })
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_moving_a_booking_releases_its_previous_slot(client, events):
+    booking = book(client, '2030-01-01', '10:00')
+    assert '10:00' not in client.get('/api/slots/2030-01-01').get_json()
+
+    response = client.put(f"/api/bookings/{booking['id']}", json={'date': '2030-01-02', 'time': '11:00'})
+
+    assert response.status_code == 200
+    assert events[-1]['released'] == [['2030-01-01', '10:00']]
+    assert events[-1]['booked'] == [['2030-01-02', '11:00']]
+    assert '10:00' in client.get('/api/slots/2030-01-01').get_json()
+    assert '11:00' not in client.get('/api/slots/2030-01-02').get_json()
+
+
+def test_cancelled_bookings_do_not_release_their_slot_again(client, events):
+    booking = book(client, '2030-02-01', '10:00')
+    assert client.delete(f"/api/bookings/{booking['id']}").status_code == 200
+    assert events[-1]['released'] == [['2030-02-01', '10:00']]
+    book(client, '2030-02-01', '10:00')
+    published = len(events)
+
+    again = client.delete(f"/api/bookings/{booking['id']}")
+    edited = client.put(f"/api/bookings/{booking['id']}", json={'notes': 'still cancelled'})
+
+    assert again.status_code == 409
+    assert edited.status_code == 200
+    assert events[published:][0]['released'] == []
+    assert len(events) == published + 1
+    assert '10:00' not in client.get('/api/slots/2030-02-01').get_json()
+
+
+def test_if_match_accepts_the_booking_etag(client):
+    booking = book(client, '2030-03-01', '10:00')
+    updated = client.put(f"/api/bookings/{booking['id']}", json={'notes': 'first'})
+    etag = updated.headers['ETag']
+
+    stale = client.put(f"/api/bookings/{booking['id']}", json={'notes': 'stale'},
+                       headers={'If-Match': f'"{booking["version"]}"'})
+    fresh = client.delete(f"/api/bookings/{booking['id']}", headers={'If-Match': etag})
+
+    assert stale.status_code == 409
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] == f'"{updated.get_json()["version"] + 1}"'
+
+
+def test_slots_etag_tracks_non_canonical_dates(app, client):
+    first = client.get('/api/slots/2030-6-1')
+    book(app.test_client(), '2030-06-01', '10:00')
+
+    again = client.get('/api/slots/2030-6-1', headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.status_code == 200
+    assert '10:00' not in again.get_json()
+
+
+def test_editing_details_does_not_touch_the_slot(client, events):
+    booking = book(client, '2030-05-01', '10:00')
+
+    response = client.put(f"/api/bookings/{booking['id']}", json={'notes': 'window seat'})
+
+    assert response.status_code == 200
+    assert events[-1]['type'] == 'booking.updated'
+    assert events[-1]['booked'] == []
+    assert events[-1]['released'] == []
+    assert '10:00' not in client.get('/api/slots/2030-05-01').get_json()
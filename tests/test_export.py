@@ -0,0 +1,53 @@
+import csv
+import gzip
+import io
+
+import pytest
+
+import server
+from test_bookings import book
+
+AUTH = {'Authorization': 'Bearer export-token'}
+
+
+@pytest.fixture(autouse=True)
+def export_token(monkeypatch):
+    monkeypatch.setattr(server, 'EXPORT_API_TOKEN', 'export-token')
+
+
+def export(client, headers=AUTH, **kwargs):
+    """GET the export and close the streamed response before the next request."""
+    with client.get('/api/admin/bookings/export', headers=headers, **kwargs) as response:
+        response.get_data()
+    return response
+
+
+def rows(response):
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_export_respects_refused_gzip(client):
+    book(client, '2030-07-01', '10:00')
+
+    refused = export(client, dict(AUTH, **{'Accept-Encoding': 'gzip;q=0'}))
+    accepted = export(client, dict(AUTH, **{'Accept-Encoding': 'gzip'}))
+
+    assert 'Content-Encoding' not in refused.headers
+    assert rows(refused)[1][0].startswith('BK')
+    assert accepted.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(accepted.get_data()) == refused.get_data()
+
+
+def test_export_resumes_after_a_row_cursor(client):
+    for time in ('09:00', '10:00', '11:00'):
+        book(client, '2030-07-02', time)
+    exported = rows(export(client))
+
+    resumed = rows(export(client, query_string={'cursor': exported[1][-1]}))
+
+    assert exported[0][-1] == 'cursor'
+    assert resumed == exported[2:]
+
+
+def test_export_requires_admin(client):
+    assert export(client, headers={}).status_code == 403
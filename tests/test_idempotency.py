@@ -0,0 +1,76 @@
+import threading
+import time
+
+import server
+
+BOOKING = {'service': 'spa', 'date': '2030-08-01', 'time': '10:00',
+           'name': 'Owner', 'email': 'owner@example.com', 'phone': '555'}
+
+
+def post(client, key, body=BOOKING):
+    return client.post('/api/bookings', json=body, headers={'Idempotency-Key': key})
+
+
+def test_repeat_replays_the_stored_response(client, events):
+    first = post(client, 'k1')
+    second = post(client, 'k1')
+
+    assert first.status_code == second.status_code == 201
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json() == first.get_json()
+    assert len(events) == 1
+
+
+def test_reusing_a_key_for_a_different_body_is_a_422(client):
+    post(client, 'k2')
+    response = post(client, 'k2', dict(BOOKING, time='11:00'))
+
+    assert response.status_code == 422
+
+
+def test_server_errors_release_the_key(client, monkeypatch):
+    original = server.booking_values
+    monkeypatch.setattr(server, 'booking_values', lambda *args: 1 / 0)
+    assert post(client, 'k3').status_code == 500
+
+    monkeypatch.setattr(server, 'booking_values', original)
+    retried = post(client, 'k3')
+    assert retried.status_code == 201
+    assert 'Idempotent-Replayed' not in retried.headers
+
+
+def test_unauthenticated_responses_release_the_key(client, monkeypatch):
+    monkeypatch.setattr(server.google, 'authorized', False)
+    assert post(client, 'k4').status_code == 401
+
+    monkeypatch.setattr(server.google, 'authorized', True)
+    assert post(client, 'k4').status_code == 201
+
+
+def test_concurrent_duplicate_waits_for_the_first_request(app, events, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+    original = server.booking_values
+
+    def slow_booking_values(*args):
+        entered.set()
+        release.wait(5)
+        return original(*args)
+
+    monkeypatch.setattr(server, 'booking_values', slow_booking_values)
+    coalesced = server.idempotency_stats['coalesced']
+    responses = {}
+    first = threading.Thread(target=lambda: responses.update(first=post(app.test_client(), 'k5')))
+    first.start()
+    assert entered.wait(5)
+    second = threading.Thread(target=lambda: responses.update(second=post(app.test_client(), 'k5')))
+    second.start()
+    time.sleep(0.2)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert responses['first'].status_code == responses['second'].status_code == 201
+    assert responses['second'].headers['Idempotent-Replayed'] == 'true'
+    assert responses['second'].get_json() == responses['first'].get_json()
+    assert len(events) == 1
+    assert server.idempotency_stats['coalesced'] == coalesced + 1
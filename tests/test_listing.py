@@ -0,0 +1,69 @@
+from sqlalchemy import text
+
+import server
+from test_bookings import book
+
+
+def all_pages(client, **params):
+    pages, cursor = [], None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        body = client.get('/api/bookings', query_string=query).get_json()
+        pages.append([(b['date'], b['time']) for b in body['bookings']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_cover_every_booking_in_order(client):
+    slots = [('2030-09-02', '09:00'), ('2030-09-01', '11:00'), ('2030-09-01', '09:00'),
+             ('2030-09-03', '10:00'), ('2030-09-02', '08:00')]
+    for date, time in slots:
+        book(client, date, time)
+
+    pages = all_pages(client, limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == sorted(slots)
+
+
+def test_listing_hides_cancelled_unless_asked(client):
+    kept = book(client, '2030-09-04', '09:00')
+    cancelled = book(client, '2030-09-04', '10:00')
+    client.delete(f"/api/bookings/{cancelled['id']}")
+
+    listed = client.get('/api/bookings').get_json()['bookings']
+    only_cancelled = client.get('/api/bookings?status=cancelled').get_json()['bookings']
+
+    assert [b['id'] for b in listed] == [kept['id']]
+    assert [b['id'] for b in only_cancelled] == [cancelled['id']]
+
+
+def test_bad_cursor_is_a_400(client):
+    assert client.get('/api/bookings?cursor=not-a-cursor').status_code == 400
+
+
+def test_rows_without_user_email_are_owned_after_the_backfill(app, client):
+    with app.app_context():
+        server.db.session.execute(text(
+            "INSERT INTO booking (id, service, date, time, name, email, phone, notes, status, version) "
+            "VALUES ('BKLEGACY', 'spa', '2030-09-05', '09:00:00.000000', 'Owner', 'owner@example.com', '555', '', 'confirmed', 1)"
+        ))
+        server.backfill_booking_user_email()
+        server.db.session.commit()
+
+    listed = client.get('/api/bookings').get_json()['bookings']
+    assert [b['id'] for b in listed] == ['BKLEGACY']
+    assert listed[0]['user_email'] == 'owner@example.com'
+
+
+def test_page_query_is_ordered_by_the_user_index(app):
+    with app.app_context():
+        query = (server.db.select(*server.booking_columns())
+                 .filter(server.owned_by('owner@example.com'), server.Booking.status != 'cancelled')
+                 .order_by(server.Booking.date, server.Booking.time, server.Booking.id).limit(51))
+        sql = str(query.compile(server.db.engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(row[-1] for row in server.db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+
+    assert 'ix_booking_user_slot' in plan
+    assert 'TEMP B-TREE' not in plan
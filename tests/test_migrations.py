@@ -0,0 +1,44 @@
+import sqlite3
+
+import server
+
+LEGACY_SCHEMA = '''CREATE TABLE booking (
+    id VARCHAR PRIMARY KEY, service VARCHAR NOT NULL, date VARCHAR NOT NULL, time VARCHAR NOT NULL,
+    name VARCHAR NOT NULL, email VARCHAR NOT NULL, phone VARCHAR NOT NULL, notes VARCHAR, status VARCHAR
+)'''
+
+
+def legacy_database(path, rows):
+    """A booking table shaped like the baseline, before any migration."""
+    with sqlite3.connect(path) as conn:
+        conn.execute(LEGACY_SCHEMA)
+        conn.executemany('INSERT INTO booking VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+            (booking_id, 'spa', '2030-01-01', time, 'Owner', 'owner@example.com', '555', '', status)
+            for booking_id, time, status in rows
+        ])
+
+
+def test_double_booked_slots_do_not_block_the_upgrade(make_app, tmp_path):
+    legacy_database(tmp_path / 'legacy.db', [
+        ('BK3', '10:00', 'confirmed'),
+        ('BK1', '10:00', 'confirmed'),
+        ('BK2', '10:00', 'confirmed'),
+        ('BK4', '10:00', 'cancelled'),
+        ('BK5', '11:00', 'confirmed'),
+    ])
+    app = make_app('legacy.db')
+
+    with app.app_context():
+        server.upgrade_database()
+        statuses = dict(server.db.session.execute(server.db.select(server.Booking.id, server.Booking.status)).all())
+        version = server.schema_state['version']
+
+    assert version == server.MIGRATIONS[-1]['version']
+    assert statuses == {'BK1': 'confirmed', 'BK2': 'conflict', 'BK3': 'conflict',
+                        'BK4': 'cancelled', 'BK5': 'confirmed'}
+    client = app.test_client()
+    assert client.get('/api/bookings').status_code == 200
+    assert client.post('/api/bookings', json={
+        'service': 'spa', 'date': '2030-01-01', 'time': '10:00',
+        'name': 'Other', 'email': 'owner@example.com', 'phone': '555'
+    }).status_code == 409